@@ -0,0 +1,44 @@
+import random
+from datetime import datetime
+from typing import Any, Iterator
+
+import pytest
+
+from fivey.client import Client
+from fivey.replay import MockServer, synthetic_order, synthetic_product
+from fivey.stores import Store
+
+
+@pytest.fixture(scope="session")
+def server() -> Iterator[MockServer]:
+    with MockServer(seed=5) as srv:
+        srv.add_synthetic_catalog(categories=10, subcategories=5, products=200)
+        srv.add_synthetic_orders(orders=200, basket_size=20)
+        yield srv
+
+
+@pytest.fixture(scope="session")
+def slow_server() -> Iterator[MockServer]:
+    with MockServer(latency=0.005, seed=5) as srv:
+        srv.add_synthetic_catalog(categories=10, subcategories=5, products=50)
+        yield srv
+
+
+@pytest.fixture
+def client(server: MockServer) -> Client:
+    cli = Client(base_url=server.url)
+    cli.store = Store("Тестовая улица, 1", "Москва", "35XY", True, True)
+    return cli
+
+
+@pytest.fixture(params=[5, 500], ids=["small", "huge"])
+def order_response(request: pytest.FixtureRequest) -> dict[str, Any]:
+    return synthetic_order(
+        datetime(2024, 1, 1), request.param, "35XY", random.Random(5)
+    )
+
+
+@pytest.fixture(params=[20, 2000], ids=["small", "huge"])
+def products_response(request: pytest.FixtureRequest) -> list[dict[str, Any]]:
+    rnd = random.Random(5)
+    return [synthetic_product(1_000_000 + i, rnd) for i in range(request.param)]
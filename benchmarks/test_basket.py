@@ -0,0 +1,24 @@
+import random
+from datetime import datetime
+
+from pytest_benchmark.fixture import BenchmarkFixture
+
+from fivey.client import Client
+from fivey.replay import MockServer, synthetic_order
+
+
+def test_bulk_put(
+    benchmark: BenchmarkFixture, client: Client, server: MockServer
+) -> None:
+    raw = synthetic_order(datetime(2024, 1, 1), 0, "35XY", random.Random(5))
+    server.add_synthetic_basket(raw)
+    client.order = client.orders.from_order_response(raw)
+    items = client.catalog.products_list("0C0")[:50]
+
+    def put_all() -> None:
+        for item in items:
+            client.basket.put(item)
+
+    benchmark.pedantic(put_all, rounds=3)
+    assert client.order is not None
+    assert len(client.order.basket) == len(items)
@@ -0,0 +1,21 @@
+from pytest_benchmark.fixture import BenchmarkFixture
+
+from fivey.client import Client
+from fivey.replay import MockServer
+from fivey.stores import Store
+
+
+def test_full_catalog_crawl(
+    benchmark: BenchmarkFixture, slow_server: MockServer
+) -> None:
+    cli = Client(base_url=slow_server.url)
+    cli.store = Store("Тестовая улица, 1", "Москва", "35XY", True, True)
+
+    def crawl() -> int:
+        total = 0
+        for cat in cli.catalog.categories():
+            for sub in cat.subcategories:
+                total += len(cli.catalog.products_list(sub.id))
+        return total
+
+    assert benchmark.pedantic(crawl, rounds=3) == 10 * 5 * 50
@@ -0,0 +1,38 @@
+from typing import Any
+
+from pytest_benchmark.fixture import BenchmarkFixture
+
+from fivey.client import Client
+
+
+def test_from_order_response(
+    benchmark: BenchmarkFixture, client: Client, order_response: dict[str, Any]
+) -> None:
+    order = benchmark(client.orders.from_order_response, order_response)
+    assert len(order.basket) == len(order_response["basket"]["items"])
+
+
+def test_basket_from_order(
+    benchmark: BenchmarkFixture, client: Client, order_response: dict[str, Any]
+) -> None:
+    items = benchmark(client.basket.from_order, order_response["basket"])
+    assert len(items) == len(order_response["basket"]["items"])
+
+
+def test_from_products(
+    benchmark: BenchmarkFixture,
+    client: Client,
+    products_response: list[dict[str, Any]],
+) -> None:
+    items = benchmark(client.catalog.from_products, products_response)
+    assert len(items) == len(products_response)
+
+
+def test_products_list(benchmark: BenchmarkFixture, client: Client) -> None:
+    items = benchmark(client.catalog.products_list, "0C0")
+    assert items
+
+
+def test_search(benchmark: BenchmarkFixture, client: Client) -> None:
+    items = benchmark(client.catalog.search, "Товар 10000")
+    assert items
@@ -0,0 +1,16 @@
+import subprocess
+import sys
+
+from pytest_benchmark.fixture import BenchmarkFixture
+
+
+def _import(module: str) -> None:
+    subprocess.run([sys.executable, "-c", f"import {module}"], check=True)
+
+
+def test_client_import(benchmark: BenchmarkFixture) -> None:
+    benchmark.pedantic(_import, args=("fivey.client",), rounds=5)
+
+
+def test_cli_import(benchmark: BenchmarkFixture) -> None:
+    benchmark.pedantic(_import, args=("fivey.cli",), rounds=5)
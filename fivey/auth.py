@@ -19,16 +19,21 @@ class AuthAPI:
         self.cli: Client = cli
 
     def check_auth(self, token: str) -> bool:
-        resp = requests.get(
-            "https://gw-el5.x5.ru/api/profile/v1/user",
-            headers={"Authorization": f"Bearer {token}"},
-            verify=False,
+        url = "https://gw-el5.x5.ru/api/profile/v1/user"
+        resp = self.cli.guarded(
+            url,
+            lambda: requests.get(
+                url,
+                headers={"Authorization": f"Bearer {token}"},
+                verify=False,
+                timeout=self.cli.timeout,
+            ),
         )
         if resp.ok:
             return True
         return False
 
-    def load_token_from_file(self) -> bool:
+    def load_token_from_file(self, check: bool = True) -> bool:
         if os.path.isfile(".token"):
             with open(".token", "r", encoding="utf-8") as inf:
                 try:
@@ -37,33 +42,33 @@ class AuthAPI:
                     refresh_token = auth_data["refresh_token"]
                 except (json.JSONDecodeError, KeyError):
                     return False
-            if self.check_auth(token):
-                self.set_token(token, refresh_token)
-                return True
+            # Без проверки токен применяется сразу, проверить его можно параллельно
+            if not check or self.check_auth(token):
+                return self.set_token(token, refresh_token, check=False)
             if refresh_token:
                 auth_data = self.fetch_refresh_token(refresh_token)
                 token = auth_data["access_token"]
                 refresh_token = auth_data["refresh_token"]
-                if self.check_auth(token):
-                    self.set_token(token, refresh_token)
-                    return True
+                return self.set_token(token, refresh_token)
         return False
 
-    def set_token(self, token: str, refresh_token: str) -> bool:
-        if self.check_auth(token):
+    def set_token(self, token: str, refresh_token: str, check: bool = True) -> bool:
+        if not check or self.check_auth(token):
             self.cli.token = token
-            self.cli.session.headers.update(
-                {
-                    "x-authorization": f"Bearer {token}",
-                    "x-device-id": uuid.UUID(
-                        "".join(random.choices(string.hexdigits, k=32))
-                    ).hex,
-                    "x-package-name": "ru.pyaterochka.app.browser",
-                    "x-platform": "android",
-                    "x-app-version": "3.2.2",
-                    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64; rv:133.0) Gecko/20100101 Firefox/133.0",
-                }
-            )
+            headers = {
+                "x-authorization": f"Bearer {token}",
+                "x-device-id": uuid.UUID(
+                    "".join(random.choices(string.hexdigits, k=32))
+                ).hex,
+                "x-package-name": "ru.pyaterochka.app.browser",
+                "x-platform": "android",
+                "x-app-version": "3.2.2",
+                "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64; rv:133.0) Gecko/20100101 Firefox/133.0",
+            }
+            # Токен из scope() подставляется в каждый запрос отдельно
+            if self.cli.scoped("token"):
+                del headers["x-authorization"]
+            self.cli.session.headers.update(headers)
             with open(".token", "w", encoding="utf-8") as outf:
                 outf.write(
                     json.dumps({"access_token": token, "refresh_token": refresh_token})
@@ -72,13 +77,18 @@ class AuthAPI:
         return False
 
     def fetch_refresh_token(self, refresh_token: str) -> dict[str, str]:
-        resp = self.cli.session.post(
-            "https://id.x5.ru/auth/realms/ssox5id/protocol/openid-connect/token",
-            data={
-                "refresh_token": refresh_token,
-                "grant_type": "refresh_token",
-                "client_id": "tc5_mob",
-            },
+        url = "https://id.x5.ru/auth/realms/ssox5id/protocol/openid-connect/token"
+        resp = self.cli.guarded(
+            url,
+            lambda: self.cli.session.post(
+                url,
+                data={
+                    "refresh_token": refresh_token,
+                    "grant_type": "refresh_token",
+                    "client_id": "tc5_mob",
+                },
+                timeout=self.cli.timeout,
+            ),
         )
         data = resp.json()
         token = data["access_token"]
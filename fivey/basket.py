@@ -1,6 +1,9 @@
+from dataclasses import replace
+import threading
 from typing import TYPE_CHECKING, Any
 
 from fivey.catalog import Item
+from fivey.metrics import timed
 from fivey.orders import Order
 
 if TYPE_CHECKING:
@@ -15,10 +18,27 @@ class BasketAPI:
     def put(self, item: Item) -> Order | None:
         if self.cli.order is None:
             return None
+        quantity = item.quantity
         if basket_item := next(
             (i for i in self.cli.order.basket if item.plu == i.plu), None
         ):
-            quantity = item.quantity + basket_item.quantity
+            quantity += basket_item.quantity
+        return self.set_quantity(item, quantity)
+
+    def remove(self, item: Item) -> Order | None:
+        return self.set_quantity(item, 0)
+
+    def set_quantity(self, item: Item, quantity: float) -> Order | None:
+        if self.cli.order is None:
+            return None
+        in_basket = any(item.plu == i.plu for i in self.cli.order.basket)
+        if quantity <= 0:
+            if not in_basket:
+                return self.cli.order
+            resp = self.cli.delete(
+                f"{self.base_path}/{self.cli.order.id}/item/{item.plu}/"
+            )
+        elif in_basket:
             resp = self.cli.put(
                 f"{self.base_path}/{self.cli.order.id}/item/{item.plu}/",
                 json={
@@ -32,7 +52,7 @@ class BasketAPI:
                 f"{self.base_path}/{self.cli.order.id}/item/",
                 json={
                     "plu": item.plu,
-                    "qty": item.quantity,
+                    "qty": quantity,
                     "uom": item.uom,
                 },
             )
@@ -41,18 +61,7 @@ class BasketAPI:
         self.cli.order = o
         return o
 
-    def remove(self, item: Item) -> Order | None:
-        if self.cli.order is None:
-            return None
-        if any([item.plu == i.plu for i in self.cli.order.basket]):
-            resp = self.cli.delete(
-                f"{self.base_path}/{self.cli.order.id}/item/{item.plu}/"
-            )
-        assert isinstance(resp, dict)
-        o = self.cli.orders.from_order_response(resp)
-        self.cli.order = o
-        return o
-
+    @timed
     def from_order(self, order_basket: dict[str, Any]) -> list[Item]:
         items = []
         for i in order_basket["items"]:
@@ -67,3 +76,74 @@ class BasketAPI:
             )
             items.append(i_obj)
         return items
+
+
+class DeferredBasket:
+    def __init__(self, cli, delay: float = 1.0) -> None:
+        self.cli: Client = cli
+        self.delay = delay
+        # plu -> (товар, итоговое количество), еще не отправленные на сервер
+        self.pending: dict[int, tuple[Item, float]] = {}
+        self.error: Exception | None = None
+        self._timer: threading.Timer | None = None
+        self._lock = threading.RLock()
+        self._flush_lock = threading.Lock()
+
+    def _quantity(self, plu: int) -> float:
+        if plu in self.pending:
+            return self.pending[plu][1]
+        if self.cli.order is None:
+            return 0
+        return next((i.quantity for i in self.cli.order.basket if i.plu == plu), 0)
+
+    def _change(self, item: Item, quantity: float) -> Order | None:
+        with self._lock:
+            self.pending[item.plu] = (item, max(quantity, 0))
+            if self._timer is not None:
+                self._timer.cancel()
+            self._timer = threading.Timer(self.delay, self._flush_quietly)
+            self._timer.daemon = True
+            self._timer.start()
+        return self.local_order()
+
+    def put(self, item: Item) -> Order | None:
+        with self._lock:
+            return self._change(item, self._quantity(item.plu) + item.quantity)
+
+    def remove(self, item: Item) -> Order | None:
+        return self._change(item, 0)
+
+    def local_order(self) -> Order | None:
+        with self._lock:
+            order = self.cli.order
+            if order is None or not self.pending:
+                return order
+            basket = [i for i in order.basket if i.plu not in self.pending]
+            for item, quantity in self.pending.values():
+                if quantity > 0:
+                    basket.append(replace(item, quantity=quantity))
+        # Оценка по ценам товаров, точную сумму вернет сервер после синхронизации
+        order_sum = round(sum(i.price * i.quantity for i in basket), 2)
+        return replace(order, basket=basket, order_sum=order_sum)
+
+    def flush(self) -> Order | None:
+        with self._flush_lock:
+            with self._lock:
+                if self._timer is not None:
+                    self._timer.cancel()
+                    self._timer = None
+                batch = dict(self.pending)
+            for plu, (item, quantity) in batch.items():
+                self.cli.basket.set_quantity(item, quantity)
+                with self._lock:
+                    if self.pending.get(plu) == (item, quantity):
+                        del self.pending[plu]
+            self.error = None
+            return self.local_order()
+
+    def _flush_quietly(self) -> None:
+        try:
+            self.flush()
+        except Exception as e:
+            # Несинхронизированные изменения остаются в pending до следующей попытки
+            self.error = e
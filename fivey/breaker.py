@@ -0,0 +1,69 @@
+import threading
+import time
+from enum import Enum
+from urllib.parse import urlsplit
+
+
+class BreakerState(Enum):
+    Closed = 0
+    Open = 1
+    HalfOpen = 2
+
+
+def endpoint_family(url: str) -> str:
+    parts = urlsplit(url)
+    if parts.netloc:
+        return parts.netloc
+    return "/" + parts.path.strip("/").split("/", 1)[0]
+
+
+class CircuitBreaker:
+    def __init__(
+        self,
+        failure_threshold: int = 5,
+        reset_timeout: float = 30.0,
+        half_open_probes: int = 1,
+    ) -> None:
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.half_open_probes = half_open_probes
+        self.state = BreakerState.Closed
+        self.failures = 0
+        self._opened_at = 0.0
+        self._probes = 0
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self.state == BreakerState.Open:
+                if time.monotonic() - self._opened_at < self.reset_timeout:
+                    return False
+                self.state = BreakerState.HalfOpen
+                self._probes = 0
+            if self.state == BreakerState.HalfOpen:
+                # Пропускаем только пробные запросы, остальные отклоняем сразу
+                if self._probes >= self.half_open_probes:
+                    return False
+                self._probes += 1
+            return True
+
+    def release(self) -> None:
+        # Запрос прерван без ответа сервиса: пробный слот возвращается без вердикта
+        with self._lock:
+            if self.state == BreakerState.HalfOpen and self._probes > 0:
+                self._probes -= 1
+
+    def record_success(self) -> None:
+        with self._lock:
+            self.state = BreakerState.Closed
+            self.failures = 0
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self.failures += 1
+            if (
+                self.state == BreakerState.HalfOpen
+                or self.failures >= self.failure_threshold
+            ):
+                self.state = BreakerState.Open
+                self._opened_at = time.monotonic()
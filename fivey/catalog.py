@@ -1,5 +1,9 @@
-from dataclasses import dataclass
-from typing import TYPE_CHECKING
+from dataclasses import dataclass, field
+import threading
+import time
+from typing import TYPE_CHECKING, Any, Iterable, Iterator
+
+from fivey.metrics import timed, timed_map
 
 if TYPE_CHECKING:
     from fivey.client import Client
@@ -35,17 +39,131 @@ class Category:
     subcategories: list[Subcategory]
 
 
+@dataclass(eq=False)
+class CategoryNode:
+    id: str
+    name: str
+    parent: "CategoryNode | None" = field(default=None, repr=False)
+    children: list["CategoryNode"] = field(default_factory=list)
+    products: list[Item] | None = field(default=None, repr=False)
+    products_loaded_at: float | None = None
+
+    @property
+    def path(self) -> list["CategoryNode"]:
+        path = []
+        node: CategoryNode | None = self
+        while node is not None:
+            path.append(node)
+            node = node.parent
+        return path[::-1]
+
+
+class CategoryTree:
+    def __init__(self, catalog: "CatalogAPI", sap_code: str, ttl: float = 3600) -> None:
+        self.catalog = catalog
+        self.sap_code = sap_code
+        self.ttl = ttl
+        self.roots: list[CategoryNode] = []
+        self.by_id: dict[str, CategoryNode] = {}
+        self.by_name: dict[str, list[CategoryNode]] = {}
+        self.loaded_at: float | None = None
+        self._lock = threading.RLock()
+
+    @property
+    def expired(self) -> bool:
+        if self.loaded_at is None:
+            return True
+        return time.monotonic() - self.loaded_at > self.ttl
+
+    def update(self, categories: list[Category]) -> None:
+        # Уже известные узлы переиспользуются вместе с загруженными товарами
+        with self._lock:
+            old = self.by_id
+            by_id: dict[str, CategoryNode] = {}
+            roots = []
+
+            def reuse(id: str, name: str, parent: CategoryNode | None) -> CategoryNode:
+                node = old.get(id) or CategoryNode(id, name)
+                node.name = name
+                node.parent = parent
+                node.children = []
+                by_id[id] = node
+                return node
+
+            for cat in categories:
+                root = reuse(cat.id, cat.name, None)
+                root.children = [reuse(s.id, s.name, root) for s in cat.subcategories]
+                roots.append(root)
+            by_name: dict[str, list[CategoryNode]] = {}
+            for node in by_id.values():
+                by_name.setdefault(node.name.casefold(), []).append(node)
+            self.roots = roots
+            self.by_id = by_id
+            self.by_name = by_name
+            self.loaded_at = time.monotonic()
+
+    def refresh(self) -> None:
+        self.update(self.catalog.categories(self.sap_code))
+
+    def node(self, id: str) -> CategoryNode | None:
+        return self.by_id.get(id)
+
+    def find(self, name: str) -> list[CategoryNode]:
+        return self.by_name.get(name.casefold(), [])
+
+    def leaves(self) -> Iterator[CategoryNode]:
+        for root in self.roots:
+            yield from root.children
+
+    def products(self, id: str, refresh: bool = False) -> list[Item]:
+        node = self.by_id[id]
+        with self._lock:
+            loaded = node.products_loaded_at
+            if (
+                not refresh
+                and loaded is not None
+                and time.monotonic() - loaded <= self.ttl
+            ):
+                assert node.products is not None
+                return node.products
+        products = self.catalog.products_list(id, self.sap_code)
+        with self._lock:
+            node.products = products
+            node.products_loaded_at = time.monotonic()
+        return products
+
+
 class CatalogAPI:
     def __init__(self, cli) -> None:
         self.cli: Client = cli
         self.base_path = "/catalog"
+        self.trees: dict[str, CategoryTree] = {}
+        self._trees_lock = threading.Lock()
 
-    def categories(self) -> list[Category]:
-        categories: list[Category] = []
+    def category_tree(
+        self, sap_code: str | None = None, ttl: float = 3600
+    ) -> CategoryTree | None:
+        if (sap_code := self._sap_code(sap_code)) is None:
+            return None
+        with self._trees_lock:
+            tree = self.trees.setdefault(sap_code, CategoryTree(self, sap_code, ttl))
+        if tree.expired:
+            tree.refresh()
+        return tree
+
+    def _sap_code(self, sap_code: str | None) -> str | None:
+        if sap_code is not None:
+            return sap_code
         if self.cli.store is None:
+            return None
+        return self.cli.store.sap_code
+
+    def categories(self, sap_code: str | None = None) -> list[Category]:
+        categories: list[Category] = []
+        if (sap_code := self._sap_code(sap_code)) is None:
             return categories
         resp = self.cli.get(
-            f"{self.base_path}/v2/stores/{self.cli.store.sap_code}/categories",
+            f"{self.base_path}/v2/stores/{sap_code}/categories",
             params={"mode": "delivery"},
         )
         for cat in resp:
@@ -60,56 +178,92 @@ class CatalogAPI:
             categories.append(c)
         return categories
 
-    def products_list(self, category_id: str) -> list[Item]:
-        if self.cli.store is None:
+    def iter_products(
+        self, sap_code: str | None = None
+    ) -> Iterator[tuple[Category, Subcategory, Item]]:
+        for cat in self.categories(sap_code):
+            for sub in cat.subcategories:
+                for item in self.iter_products_list(sub.id, sap_code):
+                    yield cat, sub, item
+
+    def iter_products_list(
+        self, category_id: str, sap_code: str | None = None
+    ) -> Iterator[Item]:
+        if (sap_code := self._sap_code(sap_code)) is None:
+            return
+        yield from timed_map(
+            self.cli.instruments,
+            "CatalogAPI.from_product",
+            self.from_product,
+            self.cli.stream(
+                f"{self.base_path}/v2/stores/{sap_code}/categories/{category_id}/products_list",
+                "products",
+                params={"mode": "delivery"},
+            ),
+        )
+
+    def products_list(
+        self, category_id: str, sap_code: str | None = None
+    ) -> list[Item]:
+        if (sap_code := self._sap_code(sap_code)) is None:
             return []
         resp = self.cli.get(
-            f"{self.base_path}/v2/stores/{self.cli.store.sap_code}/categories/{category_id}/products_list",
+            f"{self.base_path}/v2/stores/{sap_code}/categories/{category_id}/products_list",
             params={"mode": "delivery"},
         )
         assert isinstance(resp, dict)
-        items = [
-            Item(
-                plu=int(i["plu"]),
-                name=i["name"],
-                uom=i["uom"],
-                step=float(i["step"]),
-                price_regular=float(i["prices"]["regular"]),
-                price_discount=float(i["prices"]["discount"])
-                if i["prices"]["discount"]
-                else None,
-                quantity=float(i["step"]),
-            )
-            for i in resp["products"]
-        ]
-        return items
+        return self.from_products(resp["products"])
 
-    def search(self, query: str) -> list[Item]:
-        if self.cli.store is None:
+    def products_list_many(
+        self, category_ids: Iterable[str], sap_code: str | None = None
+    ) -> list[list[Item]]:
+        sap_code = self._sap_code(sap_code)
+        return list(
+            self.cli.map(lambda id: self.products_list(id, sap_code), category_ids)
+        )
+
+    def search(
+        self, query: str, offset: int = 0, sap_code: str | None = None
+    ) -> list[Item]:
+        if (sap_code := self._sap_code(sap_code)) is None:
             return []
         resp = self.cli.get(
-            f"{self.base_path}/v3/stores/{self.cli.store.sap_code}/search",
+            f"{self.base_path}/v3/stores/{sap_code}/search",
             params={
                 "q": query,
                 "mode": "delivery",
-                "offset": 0,
+                "offset": offset,
                 "include_restrict": False,
             },
         )
-        items = []
         assert isinstance(resp, dict)
-        for p in resp["products"]:
-            items.append(
-                Item(
-                    plu=p["plu"],
-                    name=p["name"],
-                    uom=p["uom"],
-                    step=float(p["step"]),
-                    price_regular=float(p["prices"]["regular"]),
-                    price_discount=float(p["prices"]["discount"])
-                    if p["prices"]["discount"]
-                    else None,
-                    quantity=float(p["step"]),
-                )
-            )
-        return items
+        return self.from_products(resp["products"])
+
+    def iter_search(self, query: str) -> Iterator[Item]:
+        offset = 0
+        seen: set[int] = set()
+        while items := self.search(query, offset):
+            # Защита от сервера, игнорирующего offset
+            fresh = [i for i in items if i.plu not in seen]
+            if not fresh:
+                return
+            seen.update(i.plu for i in fresh)
+            yield from fresh
+            offset += len(items)
+
+    @timed
+    def from_products(self, products: list[dict[str, Any]]) -> list[Item]:
+        return [self.from_product(p) for p in products]
+
+    def from_product(self, p: dict[str, Any]) -> Item:
+        return Item(
+            plu=int(p["plu"]),
+            name=p["name"],
+            uom=p["uom"],
+            step=float(p["step"]),
+            price_regular=float(p["prices"]["regular"]),
+            price_discount=float(p["prices"]["discount"])
+            if p["prices"]["discount"]
+            else None,
+            quantity=float(p["step"]),
+        )
@@ -1,12 +1,28 @@
+import atexit
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import asdict
+import json
 import os
-from typing import Any, Callable, Literal
+import sys
+import threading
+from typing import Any, Callable, Iterable, Literal, Sized
 
 from fivey.stores import Store
+from fivey.basket import DeferredBasket
 from fivey.client import Client
+from fivey.history import OrderHistory
 from fivey.orders import Card, Order
 from fivey.catalog import Item, Category, Subcategory
 
 from fivey.location import location_by_search
+from fivey.render import Screen
+from fivey.tracing import PROFILE_ENV, traced
+
+SESSION_FILE = ".session"
+HISTORY_FILE = ".orders.db"
+
+background = ThreadPoolExecutor(max_workers=4, thread_name_prefix="fivey-cli")
+screen = Screen()
 
 
 def draw_auth_menu() -> str:
@@ -15,7 +31,7 @@ def draw_auth_menu() -> str:
 
 
 def draw_header(address: str, price: str) -> str:
-    cols, _ = os.get_terminal_size()
+    cols = screen.cols
     free_space = cols - len(address) - len(price) - 8
     if free_space < 1:
         address = address[: cols - len(price) - 16] + "... "
@@ -23,6 +39,11 @@ def draw_header(address: str, price: str) -> str:
     return left_right(address, price)
 
 
+def draw_basket_error(error: Exception) -> str:
+    errors = error.exceptions if isinstance(error, ExceptionGroup) else [error]
+    return f"! Корзина не сохранена: {'; '.join(str(e) for e in errors)}\n\n"
+
+
 def draw_main_menu() -> str:
     lines = (
         "1. Каталог\n"
@@ -36,27 +57,26 @@ def draw_main_menu() -> str:
     return lines
 
 
+@traced("render", "cli")
 def draw_entire_screen(header: str, lines: str) -> None:
-    cols, _ = os.get_terminal_size()
-    cols -= 4
+    cols = screen.cols - 4
     out = [
-        f"+{"-"*(cols-2)}+\n",
-        f"| {header} |\n",
-        f"+{"-"*(cols-2)}+\n",
+        f"+{"-"*(cols-2)}+",
+        f"| {header} |",
+        f"+{"-"*(cols-2)}+",
     ]
     out.extend(
         [
-            f"| {f"{r}{" "*(cols-len(r)-4)}" if len(r) < cols-3 else f"{r[:cols-7]}..."} |\n"
+            f"| {f"{r}{" "*(cols-len(r)-4)}" if len(r) < cols-3 else f"{r[:cols-7]}..."} |"
             for r in lines.split("\n")
         ]
     )
-    out.append(f"+{"-"*(cols-2)}+\n")
-    print("".join(out), end="", flush=True)
+    out.append(f"+{"-"*(cols-2)}+")
+    screen.draw(out)
 
 
 def left_right(left: str, right: str) -> str:
-    cols, _ = os.get_terminal_size()
-    cols -= 4
+    cols = screen.cols - 4
     free_space = cols - len(left) - len(str(right)) - 4
     if free_space < 1:
         left = left[: cols - len(str(right)) - 12] + "... "
@@ -64,63 +84,142 @@ def left_right(left: str, right: str) -> str:
     return f"{left}{" " * (free_space)}{right}"
 
 
+class LazyPages:
+    def __init__(self, source: Iterable[Any], page_size: int = 10) -> None:
+        self.page_size = page_size
+        # Для списков длина известна заранее, для итераторов - только после чтения
+        self._total = len(source) if isinstance(source, Sized) else None
+        self._source = iter(source)
+        self._items: list[Any] = []
+        self._exhausted = False
+        # _fetch_lock держится на время загрузки, _lock - только на время
+        # изменения списка, чтобы уже загруженные страницы читались без ожидания
+        self._fetch_lock = threading.Lock()
+        self._lock = threading.Lock()
+
+    def _fill(self, count: int) -> None:
+        if self._exhausted or len(self._items) >= count:
+            return
+        with self._fetch_lock:
+            while not self._exhausted and len(self._items) < count:
+                try:
+                    item = next(self._source)
+                except StopIteration:
+                    self._exhausted = True
+                    break
+                with self._lock:
+                    self._items.append(item)
+
+    def page(self, n: int) -> list[Any]:
+        self._fill((n + 1) * self.page_size)
+        with self._lock:
+            return self._items[n * self.page_size : (n + 1) * self.page_size]
+
+    def has_page(self, n: int) -> bool:
+        self._fill(n * self.page_size + 1)
+        return len(self._items) > n * self.page_size
+
+    def may_have_page(self, n: int) -> bool:
+        # Не ждет загрузки: без блокировки смотрим только на уже прочитанное
+        if self._total is not None:
+            return self._total > n * self.page_size
+        return len(self._items) > n * self.page_size or not self._exhausted
+
+    def prefetch(self, n: int) -> None:
+        if not self._exhausted:
+            background.submit(self._fill, (n + 1) * self.page_size)
+
+    def remove(self, n: int, index: int) -> Any:
+        with self._lock:
+            if self._total is not None:
+                self._total -= 1
+            return self._items.pop(n * self.page_size + index)
+
+
+class Prefetcher:
+    def __init__(self) -> None:
+        self._futures: dict[Any, Future[Any]] = {}
+        self._lock = threading.Lock()
+
+    def submit(self, key: Any, fn: Callable[..., Any], *args: Any) -> Future[Any]:
+        with self._lock:
+            if key not in self._futures:
+                self._futures[key] = background.submit(fn, *args)
+            return self._futures[key]
+
+    def get(self, key: Any, fn: Callable[..., Any], *args: Any) -> Any:
+        fut = self.submit(key, fn, *args)
+        try:
+            return fut.result()
+        except Exception:
+            # Неудачная предзагрузка не должна кешироваться
+            with self._lock:
+                self._futures.pop(key, None)
+            raise
+
+    def clear(self) -> None:
+        with self._lock:
+            self._futures.clear()
+
+
 def paginate(
     order: Order,
     store: Store,
-    items: list[Item | Category | Subcategory | Store | Card],
+    items: Iterable[Item | Category | Subcategory | Store | Card],
     action: Callable,
     action_type: Literal["select", "remove", "get_value", "set_store"],
+    prefetch: Callable[[Any], Any] | None = None,
 ) -> Any:
     page = 0
-    pages: list[list[Item | Category | Subcategory | Store | Card]] = [[]]
+    pages = LazyPages(items)
     indexes = "1234567890"
-    for i in items:
-        if len(pages[page]) > 9:
-            page += 1
-            pages.append([])
-        pages[page].append(i)
-    page = 0
     while True:
+        current = pages.page(page)
+        # Следующая страница и вероятный следующий выбор грузятся в фоне
+        pages.prefetch(page + 1)
+        if prefetch:
+            for i in current:
+                prefetch(i)
         assert order.address
         header = draw_header(
             f"{order.address.house}, {order.address.street}, {order.address.city} (Пятерочка {store.sap_code})",
             f"{order.order_sum} руб. (+ {order.service_sum} руб.)",
         )
-        if not pages[page]:
+        if not current:
             lines = ["Ничего!\n"]
-        elif isinstance(pages[page][0], Item):
+        elif isinstance(current[0], Item):
             lines = [
                 f"{
                 left_right(
-                    f"{indexes[i]}. {pages[page][i].name} x{pages[page][i].quantity}",  # type: ignore
-                    f"{pages[page][i].price} / {pages[page][i].uom}"  # type: ignore
+                    f"{indexes[i]}. {current[i].name} x{current[i].quantity}",  # type: ignore
+                    f"{current[i].price} / {current[i].uom}"  # type: ignore
                 )}\n"
-                for i in range(len(pages[page]))
+                for i in range(len(current))
             ]
-        elif isinstance(pages[page][0], Category) or isinstance(
-            pages[page][0], Subcategory
+        elif isinstance(current[0], Category) or isinstance(
+            current[0], Subcategory
         ):
             lines = [
-                f"{indexes[i]}. {pages[page][i].name}\n"  # type: ignore
-                for i in range(len(pages[page]))
+                f"{indexes[i]}. {current[i].name}\n"  # type: ignore
+                for i in range(len(current))
             ]
-        elif isinstance(pages[page][0], Store):
+        elif isinstance(current[0], Store):
             lines = [
                 f"{
                 left_right(
-                    f"{indexes[i]}. {pages[page][i].shop_address}",  # type: ignore
-                    f"({pages[page][i].sap_code})"  # type: ignore
+                    f"{indexes[i]}. {current[i].shop_address}",  # type: ignore
+                    f"({current[i].sap_code})"  # type: ignore
                 )}\n"
-                for i in range(len(pages[page]))
+                for i in range(len(current))
             ]
-        elif isinstance(pages[page][0], Card):
+        elif isinstance(current[0], Card):
             lines = [
-                f"{indexes[i]}. {pages[page][i].number}\n"  # type: ignore
-                for i in range(len(pages[page]))
+                f"{indexes[i]}. {current[i].number}\n"  # type: ignore
+                for i in range(len(current))
             ]
         lines.append("\n")
-        allowed_choices = indexes[: len(pages[page])] + "bq"
-        if page < len(pages) - 1:
+        allowed_choices = indexes[: len(current)] + "bq"
+        if pages.may_have_page(page + 1):
             lines.append("n. Следующая страница\n")
             allowed_choices += "n"
         if page > 0:
@@ -136,7 +235,9 @@ def paginate(
                 got_input = True
         match letter:
             case "n":
-                page += 1
+                # Итератор мог закончиться ровно на текущей странице
+                if pages.has_page(page + 1):
+                    page += 1
             case "p":
                 page -= 1
             case "b":
@@ -145,59 +246,184 @@ def paginate(
                 quit()
             case _:
                 if action_type == "remove":
-                    pages[page].pop(indexes.index(letter))
-                    order = action(pages[page][indexes.index(letter)])
+                    order = action(pages.remove(page, indexes.index(letter)))
                 if action_type == "select":
-                    order = action(pages[page][indexes.index(letter)])
+                    order = action(current[indexes.index(letter)])
                 if action_type == "get_value":
-                    return pages[page][indexes.index(letter)]
+                    return current[indexes.index(letter)]
                 if action_type == "set_store":
-                    return action(pages[page][indexes.index(letter)])
+                    return action(current[indexes.index(letter)])
 
 
-def main():
-    cli = Client()
-    if not cli.auth.load_token_from_file():
-        header = draw_header("Неизвестно", 0.0)
-        auth = draw_auth_menu()
-        draw_entire_screen(header, auth)
-        got_input = False
-        while not got_input:
-            letter = input("Выбор: ")
-            if len(letter) == 1 and letter in "123q":
-                got_input = True
-        match letter:
-            case "1":
-                got_input = False
-                phone = ""
-                while not got_input:
-                    phone = input("Телефон: +7")
-                    if len(phone) == 10:
-                        got_input = True
-                cli.auth.cli_auth(phone)
-            case "2":
-                token = input("Вставьте токен: ")
-                cli.auth.set_token(token, "")
-            case "3" | "q":
-                quit()
-    if not cli.auth.check_auth(cli.token):
-        print("Авторизация не удалась!")
-        quit()
+def load_session() -> dict[str, Any] | None:
+    if not os.path.isfile(SESSION_FILE):
+        return None
+    with open(SESSION_FILE, "r", encoding="utf-8") as inf:
+        try:
+            data = json.loads(inf.read())
+        except json.JSONDecodeError:
+            return None
+    if not {"store", "address", "order_id"} <= data.keys():
+        return None
+    return data
+
+
+def save_session(cli: Client, addr: dict[str, Any]) -> None:
+    if cli.store is None or cli.order is None:
+        return
+    with open(SESSION_FILE, "w", encoding="utf-8") as outf:
+        outf.write(
+            json.dumps(
+                {
+                    "store": asdict(cli.store),
+                    "address": addr,
+                    "order_id": cli.order.id,
+                },
+                ensure_ascii=False,
+            )
+        )
+
+
+def resolve_order(
+    cli: Client, pool: ThreadPoolExecutor
+) -> tuple[Order, Store, dict[str, Any]]:
     prev_order = cli.orders.orders(active=True)[0]
     prev_addr = prev_order.address
+    assert prev_addr
     addr_string = f"{prev_addr.house}, {prev_addr.street}, {prev_addr.city}"
+    order = pool.submit(cli.orders.fetch_additional_data, prev_order)
     addr = location_by_search(addr_string)
-    my_store = cli.stores.store_by_location(addr["lat"], addr["lon"])
+    store = cli.stores.store_by_location(addr["lat"], addr["lon"])
+    return order.result(), store, addr
+
+
+def from_session(
+    cli: Client, session: dict[str, Any]
+) -> tuple[Order, Store, dict[str, Any]]:
+    order = cli.orders.order_by_id(session["order_id"])
+    return order, Store(**session["store"]), session["address"]
+
+
+def revalidate_session(
+    cli: Client,
+    pool: ThreadPoolExecutor,
+    session: dict[str, Any],
+) -> tuple[Order, Store, dict[str, Any]] | None:
+    # Только проверяет сессию: состояние клиента меняет главный цикл
+    order, store, fresh_addr = resolve_order(cli, pool)
+    if (
+        order.id != session["order_id"]
+        or store.sap_code != session["store"]["sap_code"]
+    ):
+        return order, store, fresh_addr
+    return None
+
+
+def interactive_auth(cli: Client) -> None:
+    header = draw_header("Неизвестно", "0.0")
+    auth = draw_auth_menu()
+    draw_entire_screen(header, auth)
+    got_input = False
+    while not got_input:
+        letter = input("Выбор: ")
+        if len(letter) == 1 and letter in "123q":
+            got_input = True
+    match letter:
+        case "1":
+            got_input = False
+            phone = ""
+            while not got_input:
+                phone = input("Телефон: +7")
+                if len(phone) == 10:
+                    got_input = True
+            cli.auth.cli_auth(phone)
+        case "2":
+            token = input("Вставьте токен: ")
+            cli.auth.set_token(token, "")
+        case "3" | "q":
+            quit()
+    if not cli.token or not cli.auth.check_auth(cli.token):
+        print("Авторизация не удалась!")
+        quit()
+
+
+def main():
+    if "--profile" in sys.argv:
+        sys.argv.remove("--profile")
+        os.environ[PROFILE_ENV] = "1"
+    if len(sys.argv) > 1:
+        from fivey.commands import run
+
+        run(sys.argv[1:])
+        return
+    cli = Client()
+    session = load_session()
+    prefetched = Prefetcher()
+
+    def bootstrap() -> Future[tuple[Order, Store, dict[str, Any]]]:
+        if session:
+            return background.submit(from_session, cli, session)
+        return background.submit(resolve_order, cli, background)
+
+    # Токен из файла проверяется параллельно с загрузкой заказа и магазина
+    boot = None
+    if cli.auth.load_token_from_file(check=False):
+        assert cli.token
+        authed = background.submit(cli.auth.check_auth, cli.token)
+        boot = bootstrap()
+        if not authed.result():
+            boot = None
+    if boot is None:
+        if not cli.auth.load_token_from_file():
+            interactive_auth(cli)
+        boot = bootstrap()
+    try:
+        order, my_store, addr = boot.result()
+    except (ExceptionGroup, IndexError):
+        # Сохраненный заказ больше недоступен
+        session = None
+        order, my_store, addr = resolve_order(cli, background)
     cli.stores.set_current_store(my_store)
-    cli.order = cli.orders.fetch_additional_data(prev_order)
+    cli.order = order
+    revalidated = None
+    if session:
+        revalidated = background.submit(revalidate_session, cli, background, session)
+    else:
+        save_session(cli, addr)
+    basket = DeferredBasket(cli)
+    # Несинхронизированные изменения корзины отправляются и при выходе
+    atexit.register(basket.flush)
     while True:
-        curr_order = cli.order
+        if revalidated is not None and revalidated.done():
+            try:
+                # Изменения корзины уходят в тот заказ, в котором были сделаны
+                basket.flush()
+            except Exception as e:
+                # Заказ не переключаем, пока корзина не отправлена
+                basket.error = e
+            else:
+                try:
+                    fresh = revalidated.result()
+                except Exception:
+                    fresh = None
+                revalidated = None
+                if fresh is not None:
+                    order, my_store, addr = fresh
+                    cli.stores.set_current_store(my_store)
+                    cli.order = order
+                save_session(cli, addr)
+        curr_order = basket.local_order()
         header = draw_header(
             f"{curr_order.address.house}, {curr_order.address.street}, {curr_order.address.city} (Пятерочка {cli.store.sap_code})",
             f"{curr_order.order_sum} руб. (+ {curr_order.service_sum} руб.)",
         )
         menu = draw_main_menu()
+        # Ошибка фоновой синхронизации видна, пока следующая отправка не пройдет
+        if basket.error is not None:
+            menu = draw_basket_error(basket.error) + menu
         draw_entire_screen(header, menu)
+        sap_code = cli.store.sap_code
+        prefetched.submit((sap_code, "categories"), cli.catalog.categories)
         got_input = False
         while not got_input:
             letter = input("Выбор: ")
@@ -205,7 +431,9 @@ def main():
                 got_input = True
                 match letter:
                     case "1":
-                        categories = cli.catalog.categories()
+                        categories = prefetched.get(
+                            (sap_code, "categories"), cli.catalog.categories
+                        )
                         sel_cat = paginate(
                             curr_order,
                             cli.store,
@@ -220,57 +448,71 @@ def main():
                                 sel_cat.subcategories,
                                 lambda x: None,
                                 action_type="get_value",
+                                prefetch=lambda sub: prefetched.submit(
+                                    (sap_code, sub.id),
+                                    cli.catalog.products_list,
+                                    sub.id,
+                                ),
                             )
                             if sel_subcat:
-                                items = cli.catalog.products_list(sel_subcat.id)
+                                items = prefetched.get(
+                                    (sap_code, sel_subcat.id),
+                                    cli.catalog.products_list,
+                                    sel_subcat.id,
+                                )
                                 paginate(
                                     curr_order,
                                     cli.store,
                                     items,
-                                    cli.basket.put,
+                                    basket.put,
                                     action_type="select",
                                 )
                     case "2":
                         query = input("Искать: ")
-                        items = cli.catalog.search(query)
+                        items = cli.catalog.iter_search(query)
                         paginate(
                             curr_order,
                             cli.store,
                             items,
-                            cli.basket.put,
+                            basket.put,
                             action_type="select",
                         )
                     case "3":
-                        items = cli.order.basket
+                        items = curr_order.basket
                         paginate(
                             curr_order,
                             cli.store,
                             items,
-                            cli.basket.remove,
+                            basket.remove,
                             action_type="remove",
                         )
                     case "4":
+                        basket.flush()
                         flat = input("Квартира: ")
                         comment = input("Комментарий: ")
-                        cli.orders.set_address_details("", flat, "", comment)
-                        cli.orders.revise()
-                        card = paginate(
-                            curr_order,
-                            cli.store,
-                            cli.orders.get_payment_methods(),
-                            lambda x: None,
-                            "get_value",
-                        )
-                        cli.orders.pay(card)
-                        cli.orders.create_order(
-                            addr["house"],
-                            addr["street"],
-                            addr["city"],
-                            addr["lat"],
-                            addr["lon"],
+                        cli.orders.checkout(
+                            lambda cards: paginate(
+                                curr_order,
+                                cli.store,
+                                cards,
+                                lambda x: None,
+                                "get_value",
+                            ),
+                            (
+                                addr["house"],
+                                addr["street"],
+                                addr["city"],
+                                addr["lat"],
+                                addr["lon"],
+                            ),
+                            flat=flat,
+                            comment=comment,
                         )
+                        save_session(cli, addr)
                     case "9":
-                        orders = cli.orders.orders(limit=10)
+                        history = OrderHistory(cli, HISTORY_FILE)
+                        history.sync()
+                        orders = history.query(limit=10)
                         lines = [
                             left_right(
                                 f"{o.human_id}: {o.address.house}, {o.address.street}, {o.address.city} ({o.total_sum} руб)",
@@ -295,6 +537,7 @@ def main():
                                     got_input = True
                                     cli.orders.cancel(order)
                     case "0":
+                        basket.flush()
                         query = input("Введите произвольный адрес: ")
                         addr = location_by_search(query)
                         my_store = cli.stores.store_by_location(
@@ -311,8 +554,10 @@ def main():
                             addr["lat"],
                             addr["lon"],
                         )
+                        save_session(cli, addr)
                     case "q":
                         quit()
 
 
-main()
+if __name__ == "__main__":
+    main()
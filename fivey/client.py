@@ -1,31 +1,169 @@
-from typing import TYPE_CHECKING, Any
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import contextmanager
+from contextvars import ContextVar, copy_context
+import threading
+import time
+from typing import TYPE_CHECKING, Any, Callable, Iterable, Iterator, TypeVar
 
 from requests import Session, Response, exceptions
+from requests.adapters import HTTPAdapter
 
+try:
+    import ijson
+except ImportError:
+    # Без ijson потоковые методы читают ответ целиком
+    ijson = None
+
+from fivey import tracing
 from fivey.auth import AuthAPI
 from fivey.basket import BasketAPI
 from fivey.catalog import CatalogAPI
-from fivey.error import FiveyError
+from fivey.breaker import CircuitBreaker, endpoint_family
+from fivey.error import ErrorKind, FiveyError, classify
+from fivey.metrics import Instrument, endpoint_template
 from fivey.orders import OrdersAPI, Order
 from fivey.stores import StoresAPI
 
 if TYPE_CHECKING:
+    from fivey.replay import Recorder
     from fivey.stores import Store
 
+T = TypeVar("T")
+
+SCOPED_STATE = ("store", "order", "token")
+
+# id клиента -> переопределенное состояние в текущем контексте
+_scopes: ContextVar[dict[int, dict[str, Any]]] = ContextVar("fivey_scopes", default={})
+
 
 class Client:
-    def __init__(self) -> None:
+    def __init__(
+        self,
+        base_url: str = "https://5d.5ka.ru/api",
+        record_dir: str | None = None,
+        timeout: float | tuple[float, float] = (5, 30),
+        workers: int = 10,
+    ) -> None:
         self.session = Session()
         self.session.verify = False
-        self.base_url = "https://5d.5ka.ru/api"
-        self.store: Store | None = None
+        # Пул потоков не больше пула соединений, иначе потоки ждут соединение
+        self.workers = workers
+        adapter = HTTPAdapter(pool_maxsize=workers)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self._executor: ThreadPoolExecutor | None = None
+        self._executor_lock = threading.Lock()
+        self._local = threading.local()
+        self.base_url = base_url
+        self.timeout = timeout
+        self.breakers: dict[str, CircuitBreaker] = {}
+        self._state: dict[str, Any] = dict.fromkeys(SCOPED_STATE)
         self.stores = StoresAPI(self)
         self.orders = OrdersAPI(self)
         self.catalog = CatalogAPI(self)
         self.auth = AuthAPI(self)
         self.basket = BasketAPI(self)
-        self.order: Order | None = None
-        self.token: str | None = None
+        self.instruments: list[Instrument] = []
+        self.recorder: Recorder | None = None
+        if record_dir is not None:
+            from fivey import replay
+
+            self.recorder = replay.Recorder(record_dir)
+        if (profiler := tracing.active()) is not None:
+            self.instruments.append(profiler.tracer)
+
+    @property
+    def executor(self) -> ThreadPoolExecutor:
+        with self._executor_lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.workers,
+                    thread_name_prefix="fivey",
+                    initializer=setattr,
+                    initargs=(self._local, "worker", True),
+                )
+            return self._executor
+
+    def submit(self, fn: Callable[..., T], *args: Any, **kwargs: Any) -> Future[T]:
+        # Задача из пула, ждущая другую задачу пула, может его исчерпать -
+        # вложенные вызовы выполняются сразу
+        if getattr(self._local, "worker", False):
+            fut: Future[T] = Future()
+            try:
+                fut.set_result(fn(*args, **kwargs))
+            except Exception as e:
+                fut.set_exception(e)
+            return fut
+        # Задача видит магазин, заказ и токен вызывающего контекста
+        return self.executor.submit(copy_context().run, fn, *args, **kwargs)
+
+    def map(self, fn: Callable[..., T], *iterables: Iterable[Any]) -> Iterator[T]:
+        futures = [self.submit(fn, *args) for args in zip(*iterables)]
+
+        def results() -> Iterator[T]:
+            for fut in futures:
+                yield fut.result()
+
+        return results()
+
+    def close(self) -> None:
+        with self._executor_lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=True)
+                self._executor = None
+        self.session.close()
+
+    def _get_state(self, name: str) -> Any:
+        scoped = _scopes.get().get(id(self), {})
+        if name in scoped:
+            return scoped[name]
+        return self._state[name]
+
+    def _set_state(self, name: str, value: Any) -> None:
+        scopes = _scopes.get()
+        scoped = scopes.get(id(self), {})
+        if name in scoped:
+            _scopes.set({**scopes, id(self): {**scoped, name: value}})
+        else:
+            self._state[name] = value
+
+    def scoped(self, name: str) -> bool:
+        return name in _scopes.get().get(id(self), {})
+
+    @contextmanager
+    def scope(self, **state: Any) -> Iterator["Client"]:
+        if unknown := state.keys() - set(SCOPED_STATE):
+            raise TypeError(f"Unknown client state: {', '.join(sorted(unknown))}")
+        scopes = _scopes.get()
+        reset = _scopes.set({**scopes, id(self): {**scopes.get(id(self), {}), **state}})
+        try:
+            yield self
+        finally:
+            _scopes.reset(reset)
+
+    @property
+    def store(self) -> "Store | None":
+        return self._get_state("store")
+
+    @store.setter
+    def store(self, value: "Store | None") -> None:
+        self._set_state("store", value)
+
+    @property
+    def order(self) -> Order | None:
+        return self._get_state("order")
+
+    @order.setter
+    def order(self, value: Order | None) -> None:
+        self._set_state("order", value)
+
+    @property
+    def token(self) -> str | None:
+        return self._get_state("token")
+
+    @token.setter
+    def token(self, value: str | None) -> None:
+        self._set_state("token", value)
 
     def _handle_api_err(self, resp: Response) -> None:
         if not resp.ok:
@@ -66,12 +204,132 @@ class Client:
                     errs.append(e)
             raise ExceptionGroup("fivey", errs)
 
+    def breaker(self, family: str) -> CircuitBreaker:
+        return self.breakers.setdefault(family, CircuitBreaker())
+
+    def guarded(self, url: str, send: Callable[[], Response]) -> Response:
+        family = endpoint_family(url)
+        breaker = self.breaker(family)
+        if not breaker.allow():
+            raise ExceptionGroup(
+                "fivey",
+                [
+                    FiveyError(
+                        {
+                            "type": "CircuitOpen",
+                            "location": family,
+                            "message": "Сервис недоступен, запрос не отправлен",
+                            "kind": ErrorKind.Transient,
+                        }
+                    )
+                ],
+            )
+        try:
+            resp = send()
+        except exceptions.RequestException:
+            breaker.record_failure()
+            raise
+        except BaseException:
+            breaker.release()
+            raise
+        if not resp.ok and classify(resp.status_code) == ErrorKind.Transient:
+            breaker.record_failure()
+        else:
+            breaker.record_success()
+        return resp
+
+    def _send(self, method: str, url: str, **kwargs: Any) -> Response:
+        kwargs.setdefault("timeout", self.timeout)
+        if self.scoped("token"):
+            kwargs["headers"] = {
+                **(kwargs.get("headers") or {}),
+                "x-authorization": f"Bearer {self.token}",
+            }
+        resp = self.guarded(
+            url,
+            lambda: self.session.request(method, self.base_url + url, **kwargs),
+        )
+        if self.recorder is not None:
+            self.recorder.record(
+                method, url, kwargs.get("params"), kwargs.get("json"), resp
+            )
+        return resp
+
+    def _request(
+        self, method: str, url: str, **kwargs: Any
+    ) -> dict[str, Any] | list[Any]:
+        if not self.instruments:
+            resp = self._send(method, url, **kwargs)
+            self._handle_api_err(resp)
+            return resp.json()
+        endpoint = endpoint_template(url)
+        for ins in self.instruments:
+            ins.on_request_start(method, endpoint)
+        status: int | None = None
+        size = 0
+        start = time.perf_counter()
+        try:
+            resp = self._send(method, url, **kwargs)
+            status = resp.status_code
+            size = len(resp.content)
+            self._handle_api_err(resp)
+            parse_start = time.perf_counter()
+            data = resp.json()
+            parse_elapsed = time.perf_counter() - parse_start
+            for ins in self.instruments:
+                ins.on_parse("json", parse_elapsed)
+            return data
+        finally:
+            elapsed = time.perf_counter() - start
+            for ins in self.instruments:
+                ins.on_request_end(method, endpoint, status, elapsed, size)
+
+    def stream(
+        self, url: str, key: str, params: dict[str, Any] | None = None
+    ) -> Iterator[dict[str, Any]]:
+        endpoint = endpoint_template(url)
+        for ins in self.instruments:
+            ins.on_request_start("GET", endpoint)
+        status: int | None = None
+        start = time.perf_counter()
+        parse_elapsed = 0.0
+        resp = None
+        try:
+            resp = self._send("GET", url, params=params, stream=True)
+            status = resp.status_code
+            self._handle_api_err(resp)
+            # Записанный ответ уже прочитан целиком, разбирать поток нечего
+            if ijson is None or self.recorder is not None:
+                parse_start = time.perf_counter()
+                items = iter(resp.json()[key])
+                parse_elapsed = time.perf_counter() - parse_start
+            else:
+                resp.raw.decode_content = True
+                items = ijson.items(resp.raw, f"{key}.item", use_float=True)
+            while True:
+                # Время разбора считается без времени, проведенного у потребителя
+                parse_start = time.perf_counter()
+                try:
+                    item = next(items)
+                except StopIteration:
+                    break
+                finally:
+                    parse_elapsed += time.perf_counter() - parse_start
+                yield item
+        finally:
+            size = resp.raw.tell() if resp is not None else 0
+            if resp is not None:
+                resp.close()
+            elapsed = time.perf_counter() - start
+            for ins in self.instruments:
+                if status is not None and status < 400:
+                    ins.on_parse("json", parse_elapsed)
+                ins.on_request_end("GET", endpoint, status, elapsed, size)
+
     def get(
         self, url: str, params: dict[str, Any] | None = None
     ) -> dict[str, Any] | list[Any]:
-        resp = self.session.get(self.base_url + url, params=params)
-        self._handle_api_err(resp)
-        return resp.json()
+        return self._request("GET", url, params=params)
 
     def post(
         self,
@@ -79,27 +337,19 @@ class Client:
         json: dict[str, Any] | None = None,
         headers: dict[str, Any] | None = None,
     ) -> dict[str, Any] | list[Any]:
-        resp = self.session.post(self.base_url + url, json=json, headers=headers)
-        self._handle_api_err(resp)
-        return resp.json()
+        return self._request("POST", url, json=json, headers=headers)
 
     def put(
         self, url: str, json: dict[str, Any] | None = None
     ) -> dict[str, Any] | list[Any]:
-        resp = self.session.put(self.base_url + url, json=json)
-        self._handle_api_err(resp)
-        return resp.json()
+        return self._request("PUT", url, json=json)
 
     def patch(
         self, url: str, json: dict[str, Any] | None = None
     ) -> dict[str, Any] | list[Any]:
-        resp = self.session.patch(self.base_url + url, json=json)
-        self._handle_api_err(resp)
-        return resp.json()
+        return self._request("PATCH", url, json=json)
 
     def delete(
         self, url: str, json: dict[str, Any] | None = None
     ) -> dict[str, Any] | list[Any]:
-        resp = self.session.delete(self.base_url + url, json=json)
-        self._handle_api_err(resp)
-        return resp.json()
+        return self._request("DELETE", url, json=json)
@@ -0,0 +1,198 @@
+import argparse
+from collections import deque
+import json
+import sys
+from concurrent.futures import Future
+from dataclasses import asdict, is_dataclass
+from datetime import datetime
+from enum import Enum
+from itertools import islice
+from typing import Any, Callable, Iterable, Iterator, TypeVar
+
+from fivey.catalog import Item
+from fivey.client import Client
+from fivey.export import ORDER_SCHEMA, WRITERS, order_rows, write_rows
+from fivey.stores import Store
+
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+
+def windowed_map(
+    cli: Client, fn: Callable[[T], R], items: Iterable[T], window: int
+) -> Iterator[R]:
+    # В отличие от Client.map не читает вход целиком: в работе не больше window задач
+    pending: deque[Future[R]] = deque()
+    for item in items:
+        pending.append(cli.submit(fn, item))
+        if len(pending) >= window:
+            yield pending.popleft().result()
+    while pending:
+        yield pending.popleft().result()
+
+
+def _default(obj: Any) -> Any:
+    if isinstance(obj, datetime):
+        return obj.isoformat()
+    if isinstance(obj, Enum):
+        return obj.name
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+def emit(records: Iterable[Any], fmt: str) -> None:
+    rows = (asdict(r) if is_dataclass(r) else r for r in records)
+    if fmt == "ndjson":
+        for row in rows:
+            sys.stdout.write(json.dumps(row, ensure_ascii=False, default=_default))
+            sys.stdout.write("\n")
+    else:
+        json.dump(list(rows), sys.stdout, ensure_ascii=False, default=_default)
+        sys.stdout.write("\n")
+    sys.stdout.flush()
+
+
+def _login(cli: Client) -> None:
+    if not cli.auth.load_token_from_file():
+        sys.exit("Нет действующего токена, авторизуйтесь через интерактивный fivey")
+
+
+def _use_store(cli: Client, sap_code: str) -> None:
+    cli.stores.set_current_store(Store("", "", sap_code, True, False))
+
+
+def basket_apply(cli: Client, args: argparse.Namespace) -> None:
+    _login(cli)
+    with open(args.file, "r", encoding="utf-8") as inf:
+        entries = json.loads(inf.read())
+    # Повторяющиеся позиции сливаются в одну
+    wanted: dict[int, dict[str, Any]] = {}
+    for e in entries:
+        entry = wanted.setdefault(
+            int(e["plu"]), {"qty": 0.0, "uom": e.get("uom", "шт")}
+        )
+        entry["qty"] += float(e.get("qty", 1))
+    active = cli.orders.orders(active=True)
+    if not active:
+        sys.exit("Нет активного заказа")
+    cli.order = cli.orders.fetch_additional_data(active[0])
+    _use_store(cli, cli.order.sap_code)
+    items = [
+        Item(plu, "", e["uom"], e["qty"], 0.0, None, e["qty"])
+        for plu, e in wanted.items()
+    ]
+    list(cli.map(cli.basket.put, items))
+    cli.order = cli.orders.fetch_additional_data(cli.order)
+    emit([cli.order], args.format)
+
+
+def orders_export(cli: Client, args: argparse.Namespace) -> None:
+    _login(cli)
+    if args.format == "parquet" and args.output == "-":
+        sys.exit("Parquet записывается только в файл, укажите --output")
+    orders: Iterable[Any] = cli.orders.iter_orders(active=args.active)
+    if args.limit:
+        orders = islice(orders, args.limit)
+    if args.details:
+        orders = windowed_map(
+            cli, cli.orders.fetch_additional_data, orders, args.parallel * 2
+        )
+    write_rows(
+        (row for o in orders for row in order_rows(o)),
+        args.output,
+        ORDER_SCHEMA,
+        args.format,
+        batch_size=100,
+    )
+
+
+def catalog_crawl(cli: Client, args: argparse.Namespace) -> None:
+    _login(cli)
+    _use_store(cli, args.store)
+    subcategories = [
+        (cat, sub) for cat in cli.catalog.categories() for sub in cat.subcategories
+    ]
+
+    def crawl(pair: tuple[Any, Any]) -> list[dict[str, Any]]:
+        cat, sub = pair
+        return [
+            {
+                **asdict(item),
+                "sap_code": args.store,
+                "category_id": cat.id,
+                "subcategory_id": sub.id,
+            }
+            for item in cli.catalog.products_list(sub.id)
+        ]
+
+    emit(
+        (row for rows in cli.map(crawl, subcategories) for row in rows),
+        args.format,
+    )
+
+
+def stores_near(cli: Client, args: argparse.Namespace) -> None:
+    _login(cli)
+    emit(
+        cli.stores.nearby_stores_by_location(args.lat, args.lon, args.radius),
+        args.format,
+    )
+
+
+def build_parser() -> argparse.ArgumentParser:
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument(
+        "--format", choices=["json", "ndjson"], default="ndjson", help="Формат вывода"
+    )
+    parser = argparse.ArgumentParser(prog="fivey")
+    sub = parser.add_subparsers(dest="group", required=True)
+
+    basket = sub.add_parser("basket").add_subparsers(dest="command", required=True)
+    apply = basket.add_parser(
+        "apply", parents=[common], help="Добавить товары из JSON-списка"
+    )
+    apply.add_argument("file", help='[{"plu": 123, "qty": 1, "uom": "шт"}, ...]')
+    apply.add_argument("--parallel", type=int, default=1)
+    apply.set_defaults(func=basket_apply)
+
+    orders = sub.add_parser("orders").add_subparsers(dest="command", required=True)
+    export = orders.add_parser("export", help="Выгрузить историю заказов")
+    export.add_argument(
+        "--format", choices=list(WRITERS), default="ndjson", help="Формат вывода"
+    )
+    export.add_argument(
+        "--output", default="-", help="Файл для выгрузки, по умолчанию stdout"
+    )
+    export.add_argument("--limit", type=int, default=0)
+    export.add_argument("--active", action="store_true")
+    export.add_argument(
+        "--details", action="store_true", help="Загрузить корзину каждого заказа"
+    )
+    export.add_argument("--parallel", type=int, default=4)
+    export.set_defaults(func=orders_export)
+
+    catalog = sub.add_parser("catalog").add_subparsers(dest="command", required=True)
+    crawl = catalog.add_parser(
+        "crawl", parents=[common], help="Выгрузить весь каталог магазина"
+    )
+    crawl.add_argument("--store", required=True, help="SAP-код магазина")
+    crawl.add_argument("--parallel", type=int, default=4)
+    crawl.set_defaults(func=catalog_crawl)
+
+    stores = sub.add_parser("stores").add_subparsers(dest="command", required=True)
+    near = stores.add_parser("near", parents=[common], help="Магазины рядом с точкой")
+    near.add_argument("lat", type=float)
+    near.add_argument("lon", type=float)
+    near.add_argument("--radius", type=float, default=0.025)
+    near.set_defaults(func=stores_near)
+    return parser
+
+
+def run(argv: list[str]) -> None:
+    args = build_parser().parse_args(argv)
+    # Пул клиента и пул соединений под ним совпадают с --parallel
+    cli = Client(workers=args.parallel) if "parallel" in args else Client()
+    try:
+        args.func(cli, args)
+    finally:
+        cli.close()
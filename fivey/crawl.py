@@ -0,0 +1,250 @@
+import os
+import socket
+import sqlite3
+import time
+from abc import ABC, abstractmethod
+from dataclasses import dataclass
+from multiprocessing import Process
+from typing import TYPE_CHECKING, Protocol
+
+from fivey.catalog import Item
+
+if TYPE_CHECKING:
+    from fivey.client import Client
+
+
+@dataclass
+class WorkUnit:
+    id: str
+    sap_code: str
+    # None - единица поиска категорий магазина
+    category_id: str | None
+    attempts: int = 0
+
+
+def category_unit(sap_code: str, category_id: str | None = None) -> WorkUnit:
+    return WorkUnit(f"{sap_code}:{category_id or '*'}", sap_code, category_id)
+
+
+class WorkQueue(ABC):
+    @abstractmethod
+    def put(self, units: list[WorkUnit]) -> None: ...
+
+    @abstractmethod
+    def lease(self, worker: str, count: int, lease_time: float) -> list[WorkUnit]: ...
+
+    # complete и fail действуют, только пока аренда принадлежит worker:
+    # воркер с истекшей арендой не должен менять чужую единицу
+    @abstractmethod
+    def complete(self, worker: str, unit: WorkUnit) -> bool: ...
+
+    @abstractmethod
+    def fail(self, worker: str, unit: WorkUnit, error: str) -> bool: ...
+
+    @abstractmethod
+    def stats(self) -> dict[str, int]: ...
+
+    def drained(self) -> bool:
+        stats = self.stats()
+        return not stats.get("pending") and not stats.get("leased")
+
+
+class SQLiteQueue(WorkQueue):
+    def __init__(self, path: str, max_attempts: int = 5) -> None:
+        self.max_attempts = max_attempts
+        self.db = sqlite3.connect(path, timeout=30, isolation_level=None)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS units ("
+            " id TEXT PRIMARY KEY,"
+            " sap_code TEXT NOT NULL,"
+            " category_id TEXT,"
+            " state TEXT NOT NULL DEFAULT 'pending',"
+            " attempts INTEGER NOT NULL DEFAULT 0,"
+            " leased_by TEXT,"
+            " lease_until REAL,"
+            " error TEXT)"
+        )
+        self.db.execute(
+            "CREATE INDEX IF NOT EXISTS units_state ON units (state, lease_until)"
+        )
+
+    def put(self, units: list[WorkUnit]) -> None:
+        self.db.executemany(
+            "INSERT OR IGNORE INTO units (id, sap_code, category_id) VALUES (?, ?, ?)",
+            [(u.id, u.sap_code, u.category_id) for u in units],
+        )
+
+    def lease(self, worker: str, count: int, lease_time: float) -> list[WorkUnit]:
+        now = time.time()
+        # Просроченная аренда означает, что воркер умер - отдаем единицу другому
+        self.db.execute("BEGIN IMMEDIATE")
+        try:
+            # Единица, которая раз за разом роняет воркер, тоже исчерпывает попытки
+            self.db.execute(
+                "UPDATE units SET state = 'failed', lease_until = NULL,"
+                " error = 'lease expired'"
+                " WHERE state = 'leased' AND lease_until < ? AND attempts >= ?",
+                (now, self.max_attempts),
+            )
+            rows = self.db.execute(
+                "SELECT id, sap_code, category_id, attempts FROM units"
+                " WHERE state = 'pending' OR (state = 'leased' AND lease_until < ?)"
+                " LIMIT ?",
+                (now, count),
+            ).fetchall()
+            self.db.executemany(
+                "UPDATE units SET state = 'leased', leased_by = ?, lease_until = ?,"
+                " attempts = attempts + 1 WHERE id = ?",
+                [(worker, now + lease_time, r[0]) for r in rows],
+            )
+            self.db.execute("COMMIT")
+        except BaseException:
+            self.db.execute("ROLLBACK")
+            raise
+        return [WorkUnit(r[0], r[1], r[2], r[3] + 1) for r in rows]
+
+    def complete(self, worker: str, unit: WorkUnit) -> bool:
+        cur = self.db.execute(
+            "UPDATE units SET state = 'done', lease_until = NULL"
+            " WHERE id = ? AND state = 'leased' AND leased_by = ? AND attempts = ?",
+            (unit.id, worker, unit.attempts),
+        )
+        return cur.rowcount > 0
+
+    def fail(self, worker: str, unit: WorkUnit, error: str) -> bool:
+        state = "failed" if unit.attempts >= self.max_attempts else "pending"
+        cur = self.db.execute(
+            "UPDATE units SET state = ?, error = ?, lease_until = NULL"
+            " WHERE id = ? AND state = 'leased' AND leased_by = ? AND attempts = ?",
+            (state, error, unit.id, worker, unit.attempts),
+        )
+        return cur.rowcount > 0
+
+    def stats(self) -> dict[str, int]:
+        return dict(self.db.execute("SELECT state, COUNT(*) FROM units GROUP BY state"))
+
+
+class ResultSink(Protocol):
+    def write(self, unit: WorkUnit, items: list[Item]) -> None: ...
+
+
+class SQLiteSink:
+    def __init__(self, path: str) -> None:
+        self.db = sqlite3.connect(path, timeout=30)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS products ("
+            " sap_code TEXT NOT NULL,"
+            " plu INTEGER NOT NULL,"
+            " category_id TEXT NOT NULL,"
+            " name TEXT,"
+            " uom TEXT,"
+            " step REAL,"
+            " price_regular REAL,"
+            " price_discount REAL,"
+            " fetched_at REAL,"
+            " PRIMARY KEY (sap_code, plu))"
+        )
+
+    def write(self, unit: WorkUnit, items: list[Item]) -> None:
+        now = time.time()
+        with self.db:
+            self.db.executemany(
+                "INSERT OR REPLACE INTO products VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                [
+                    (
+                        unit.sap_code,
+                        i.plu,
+                        unit.category_id,
+                        i.name,
+                        i.uom,
+                        i.step,
+                        i.price_regular,
+                        i.price_discount,
+                        now,
+                    )
+                    for i in items
+                ],
+            )
+
+
+class CrawlCoordinator:
+    def __init__(self, queue: WorkQueue) -> None:
+        self.queue = queue
+
+    def seed(self, sap_codes: list[str]) -> None:
+        self.queue.put([category_unit(sap) for sap in sap_codes])
+
+    def process(self, cli: "Client", unit: WorkUnit, sink: ResultSink) -> None:
+        if unit.category_id is None:
+            self.queue.put(
+                [
+                    category_unit(unit.sap_code, sub.id)
+                    for cat in cli.catalog.categories(unit.sap_code)
+                    for sub in cat.subcategories
+                ]
+            )
+            return
+        sink.write(unit, cli.catalog.products_list(unit.category_id, unit.sap_code))
+
+    def run_worker(
+        self,
+        cli: "Client",
+        sink: ResultSink,
+        worker: str | None = None,
+        batch: int = 4,
+        lease_time: float = 120,
+        poll_interval: float = 1.0,
+    ) -> None:
+        worker = worker or f"{socket.gethostname()}:{os.getpid()}"
+        while True:
+            units = self.queue.lease(worker, batch, lease_time)
+            if not units:
+                if self.queue.drained():
+                    return
+                time.sleep(poll_interval)
+                continue
+            for unit in units:
+                try:
+                    self.process(cli, unit, sink)
+                except Exception as e:
+                    self.queue.fail(worker, unit, repr(e))
+                else:
+                    self.queue.complete(worker, unit)
+
+
+def _sqlite_worker(
+    queue_path: str, results_path: str, batch: int, client_kwargs: dict
+) -> None:
+    from fivey.client import Client
+
+    cli = Client(**client_kwargs)
+    cli.auth.load_token_from_file()
+    CrawlCoordinator(SQLiteQueue(queue_path)).run_worker(
+        cli, SQLiteSink(results_path), batch=batch
+    )
+
+
+def crawl_local(
+    queue_path: str,
+    results_path: str,
+    sap_codes: list[str],
+    processes: int | None = None,
+    batch: int = 4,
+    **client_kwargs,
+) -> dict[str, int]:
+    queue = SQLiteQueue(queue_path)
+    CrawlCoordinator(queue).seed(sap_codes)
+    workers = [
+        Process(
+            target=_sqlite_worker,
+            args=(queue_path, results_path, batch, client_kwargs),
+        )
+        for _ in range(processes or os.cpu_count() or 1)
+    ]
+    for p in workers:
+        p.start()
+    for p in workers:
+        p.join()
+    return queue.stats()
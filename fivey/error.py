@@ -1,3 +1,26 @@
+from enum import Enum
+
+
+class ErrorKind(Enum):
+    Transient = "transient"
+    Auth = "auth"
+    Validation = "validation"
+    NotFound = "not_found"
+    Unknown = "unknown"
+
+
+def classify(http_code: int | None) -> ErrorKind:
+    if http_code is None or http_code in (408, 425, 429) or http_code >= 500:
+        return ErrorKind.Transient
+    if http_code in (401, 403):
+        return ErrorKind.Auth
+    if http_code in (404, 410):
+        return ErrorKind.NotFound
+    if http_code in (400, 409, 422):
+        return ErrorKind.Validation
+    return ErrorKind.Unknown
+
+
 class FiveyError(Exception):
     def __init__(self, data, *args: object) -> None:
         super().__init__(*args)
@@ -5,6 +28,11 @@ class FiveyError(Exception):
         self.type = data.get("type")
         self.location = data.get("location")
         self.message = data.get("message")
+        self.kind: ErrorKind = data.get("kind") or classify(self.http_code)
+
+    @property
+    def transient(self) -> bool:
+        return self.kind == ErrorKind.Transient
 
     def __str__(self) -> str:
         return f"{self.location}: {self.message}"
@@ -0,0 +1,223 @@
+import csv
+import json
+import sys
+from itertools import islice
+from typing import TYPE_CHECKING, Any, Iterable, Iterator, Protocol, TextIO
+
+from fivey.catalog import Category, Item, Subcategory
+from fivey.orders import Order
+
+if TYPE_CHECKING:
+    from fivey.client import Client
+
+Schema = list[tuple[str, type]]
+
+ITEM_SCHEMA: Schema = [
+    ("plu", int),
+    ("name", str),
+    ("uom", str),
+    ("step", float),
+    ("price_regular", float),
+    ("price_discount", float),
+    ("quantity", float),
+]
+
+ORDER_SCHEMA: Schema = [
+    ("order_id", str),
+    ("human_id", int),
+    ("status", str),
+    ("total_sum", float),
+    ("service_sum", float),
+    ("order_sum", float),
+    ("is_active", bool),
+    ("house", str),
+    ("street", str),
+    ("city", str),
+    ("created", str),
+    ("sap_code", str),
+    ("shop_address", str),
+    *ITEM_SCHEMA,
+]
+
+PRODUCT_SCHEMA: Schema = [
+    ("sap_code", str),
+    ("category_id", str),
+    ("category_name", str),
+    ("subcategory_id", str),
+    ("subcategory_name", str),
+    *ITEM_SCHEMA,
+]
+
+
+def _item_fields(item: Item | None) -> dict[str, Any]:
+    if item is None:
+        return {name: None for name, _ in ITEM_SCHEMA}
+    return {
+        "plu": item.plu,
+        "name": item.name,
+        "uom": item.uom,
+        "step": item.step,
+        "price_regular": item.price_regular,
+        "price_discount": item.price_discount,
+        "quantity": item.quantity,
+    }
+
+
+def order_rows(order: Order) -> Iterator[dict[str, Any]]:
+    head = {
+        "order_id": order.id,
+        "human_id": order.human_id,
+        "status": order.status.name,
+        "total_sum": order.total_sum,
+        "service_sum": order.service_sum,
+        "order_sum": order.order_sum,
+        "is_active": order.is_active,
+        "house": order.address.house if order.address else None,
+        "street": order.address.street if order.address else None,
+        "city": order.address.city if order.address else None,
+        "created": order.created.isoformat() if order.created else None,
+        "sap_code": order.sap_code,
+        "shop_address": order.shop_address,
+    }
+    # Заказ без корзины все равно попадает в выгрузку одной строкой
+    for item in order.basket or [None]:
+        yield {**head, **_item_fields(item)}
+
+
+def product_row(
+    sap_code: str, category: Category, subcategory: Subcategory, item: Item
+) -> dict[str, Any]:
+    return {
+        "sap_code": sap_code,
+        "category_id": category.id,
+        "category_name": category.name,
+        "subcategory_id": subcategory.id,
+        "subcategory_name": subcategory.name,
+        **_item_fields(item),
+    }
+
+
+class Writer(Protocol):
+    def write_batch(self, rows: list[dict[str, Any]]) -> None: ...
+
+    def close(self) -> None: ...
+
+
+def _open_text(path: str, newline: str | None = None) -> TextIO:
+    # "-" - вывод в stdout
+    if path == "-":
+        return sys.stdout
+    return open(path, "w", encoding="utf-8", newline=newline)
+
+
+def _close_text(outf: TextIO) -> None:
+    if outf is sys.stdout:
+        outf.flush()
+    else:
+        outf.close()
+
+
+class NDJSONWriter:
+    def __init__(self, path: str, schema: Schema) -> None:
+        self.names = [name for name, _ in schema]
+        self.outf = _open_text(path)
+
+    def write_batch(self, rows: list[dict[str, Any]]) -> None:
+        self.outf.write(
+            "".join(
+                json.dumps({n: r[n] for n in self.names}, ensure_ascii=False) + "\n"
+                for r in rows
+            )
+        )
+
+    def close(self) -> None:
+        _close_text(self.outf)
+
+
+class CSVWriter:
+    def __init__(self, path: str, schema: Schema) -> None:
+        self.outf = _open_text(path, newline="")
+        self.writer = csv.DictWriter(self.outf, [name for name, _ in schema])
+        self.writer.writeheader()
+
+    def write_batch(self, rows: list[dict[str, Any]]) -> None:
+        self.writer.writerows(rows)
+
+    def close(self) -> None:
+        _close_text(self.outf)
+
+
+class ParquetWriter:
+    def __init__(self, path: str, schema: Schema) -> None:
+        # Необязательная зависимость, нужна только для Parquet
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        types = {
+            int: pa.int64(),
+            float: pa.float64(),
+            str: pa.string(),
+            bool: pa.bool_(),
+        }
+        self.pa = pa
+        self.schema = pa.schema([(name, types[t]) for name, t in schema])
+        self.writer = pq.ParquetWriter(path, self.schema)
+
+    def write_batch(self, rows: list[dict[str, Any]]) -> None:
+        self.writer.write_table(self.pa.Table.from_pylist(rows, schema=self.schema))
+
+    def close(self) -> None:
+        self.writer.close()
+
+
+WRITERS: dict[str, type[Writer]] = {
+    "ndjson": NDJSONWriter,
+    "csv": CSVWriter,
+    "parquet": ParquetWriter,
+}
+
+
+def write_rows(
+    rows: Iterable[dict[str, Any]],
+    path: str,
+    schema: Schema,
+    fmt: str = "ndjson",
+    batch_size: int = 1000,
+) -> int:
+    writer = WRITERS[fmt](path, schema)  # type: ignore[call-arg]
+    written = 0
+    rows = iter(rows)
+    try:
+        while batch := list(islice(rows, batch_size)):
+            writer.write_batch(batch)
+            written += len(batch)
+    finally:
+        writer.close()
+    return written
+
+
+def export_orders(
+    cli: "Client",
+    path: str,
+    fmt: str = "ndjson",
+    details: bool = True,
+    batch_size: int = 1000,
+) -> int:
+    orders: Iterable[Order] = cli.orders.iter_orders()
+    if details:
+        orders = map(cli.orders.fetch_additional_data, orders)
+    rows = (row for o in orders for row in order_rows(o))
+    return write_rows(rows, path, ORDER_SCHEMA, fmt, batch_size)
+
+
+def export_catalog(
+    cli: "Client", path: str, fmt: str = "ndjson", batch_size: int = 1000
+) -> int:
+    if cli.store is None:
+        return 0
+    sap_code = cli.store.sap_code
+    rows = (
+        product_row(sap_code, cat, sub, item)
+        for cat, sub, item in cli.catalog.iter_products()
+    )
+    return write_rows(rows, path, PRODUCT_SCHEMA, fmt, batch_size)
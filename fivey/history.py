@@ -0,0 +1,249 @@
+from dataclasses import dataclass
+from datetime import datetime
+import sqlite3
+import time
+from typing import TYPE_CHECKING, Any
+
+from fivey.catalog import Item
+from fivey.orders import Address, Order, OrderStatus
+
+if TYPE_CHECKING:
+    from fivey.client import Client
+
+TERMINAL_STATUSES = {
+    OrderStatus.Completed,
+    OrderStatus.Delivered,
+    OrderStatus.Cancelled,
+}
+
+ORDER_COLUMNS = (
+    "id, human_id, status, total_sum, service_sum, order_sum, is_active,"
+    " house, street, city, created, sap_code, shop_address"
+)
+
+
+@dataclass
+class SyncResult:
+    added: int = 0
+    updated: int = 0
+    refreshed: int = 0
+    pages: int = 0
+
+
+class OrderHistory:
+    def __init__(self, cli, path: str = ".orders.db") -> None:
+        self.cli: Client = cli
+        self.db = sqlite3.connect(path)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.executescript(
+            "CREATE TABLE IF NOT EXISTS orders ("
+            " id TEXT PRIMARY KEY,"
+            " human_id INTEGER,"
+            " status INTEGER NOT NULL,"
+            " total_sum REAL,"
+            " service_sum REAL,"
+            " order_sum REAL,"
+            " is_active INTEGER,"
+            " house TEXT,"
+            " street TEXT,"
+            " city TEXT,"
+            " created TEXT,"
+            " sap_code TEXT,"
+            " shop_address TEXT,"
+            " synced_at REAL);"
+            "CREATE TABLE IF NOT EXISTS order_items ("
+            " order_id TEXT NOT NULL REFERENCES orders (id) ON DELETE CASCADE,"
+            " pos INTEGER NOT NULL,"
+            " plu INTEGER NOT NULL,"
+            " name TEXT,"
+            " uom TEXT,"
+            " step REAL,"
+            " price_regular REAL,"
+            " price_discount REAL,"
+            " quantity REAL,"
+            " PRIMARY KEY (order_id, pos));"
+            "CREATE INDEX IF NOT EXISTS orders_created ON orders (created);"
+            "CREATE INDEX IF NOT EXISTS orders_status ON orders (status, created);"
+            "CREATE INDEX IF NOT EXISTS orders_address ON orders (city, street, house);"
+            "CREATE INDEX IF NOT EXISTS order_items_plu ON order_items (plu);"
+            "CREATE TABLE IF NOT EXISTS sync_state ("
+            " key TEXT PRIMARY KEY,"
+            " value TEXT);"
+        )
+
+    def _get_state(self, key: str) -> str | None:
+        row = self.db.execute(
+            "SELECT value FROM sync_state WHERE key = ?", (key,)
+        ).fetchone()
+        return row[0] if row else None
+
+    def _set_state(self, key: str, value: str) -> None:
+        with self.db:
+            self.db.execute(
+                "INSERT OR REPLACE INTO sync_state VALUES (?, ?)", (key, value)
+            )
+
+    def _stored_status(self, order_id: str) -> OrderStatus | None:
+        row = self.db.execute(
+            "SELECT status FROM orders WHERE id = ?", (order_id,)
+        ).fetchone()
+        return OrderStatus(row[0]) if row else None
+
+    def save(self, order: Order) -> None:
+        with self.db:
+            self.db.execute(
+                f"INSERT OR REPLACE INTO orders ({ORDER_COLUMNS}, synced_at)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    order.id,
+                    order.human_id,
+                    order.status.value,
+                    order.total_sum,
+                    order.service_sum,
+                    order.order_sum,
+                    order.is_active,
+                    order.address.house if order.address else None,
+                    order.address.street if order.address else None,
+                    order.address.city if order.address else None,
+                    order.created.isoformat() if order.created else None,
+                    order.sap_code,
+                    order.shop_address,
+                    time.time(),
+                ),
+            )
+            self.db.execute("DELETE FROM order_items WHERE order_id = ?", (order.id,))
+            self.db.executemany(
+                "INSERT INTO order_items VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                [
+                    (
+                        order.id,
+                        pos,
+                        i.plu,
+                        i.name,
+                        i.uom,
+                        i.step,
+                        i.price_regular,
+                        i.price_discount,
+                        i.quantity,
+                    )
+                    for pos, i in enumerate(order.basket)
+                ],
+            )
+
+    def sync(self, page_size: int = 20) -> SyncResult:
+        result = SyncResult()
+        seen: set[str] = set()
+        # Список заказов приходит без корзин, поэтому новые и изменившиеся
+        # заказы догружаются целиком пачками по странице
+        batch: list[Order] = []
+
+        def save_batch() -> None:
+            for order in self.cli.orders.fetch_additional_data_many(batch):
+                self.save(order)
+            batch.clear()
+
+        # Заказы идут от новых к старым. Граница - самый новый заказ последней
+        # завершенной синхронизации: все, что старше, уже сохранено. Прерванная
+        # синхронизация границу не сдвигает, и следующая дочитывает пропуск
+        boundary = self._get_state("boundary")
+        newest: str | None = None
+        for n, order in enumerate(self.cli.orders.iter_orders(page_size)):
+            if n % page_size == 0:
+                result.pages += 1
+            if newest is None:
+                newest = order.id
+            if order.id == boundary:
+                break
+            stored = self._stored_status(order.id)
+            if stored in TERMINAL_STATUSES:
+                continue
+            seen.add(order.id)
+            batch.append(order)
+            if stored is None:
+                result.added += 1
+            else:
+                result.updated += 1
+            if len(batch) >= page_size:
+                save_batch()
+        save_batch()
+        if newest is not None:
+            self._set_state("boundary", newest)
+        # Незавершенные заказы глубже в истории обновляем по одному
+        stale = [
+            r[0]
+            for r in self.db.execute(
+                "SELECT id FROM orders WHERE status NOT IN ({})".format(
+                    ", ".join("?" * len(TERMINAL_STATUSES))
+                ),
+                [s.value for s in TERMINAL_STATUSES],
+            )
+            if r[0] not in seen
+        ]
+        for order in self.cli.map(self.cli.orders.order_by_id, stale):
+            self.save(order)
+            result.refreshed += 1
+        return result
+
+    def query(
+        self,
+        since: datetime | None = None,
+        until: datetime | None = None,
+        status: OrderStatus | list[OrderStatus] | None = None,
+        city: str | None = None,
+        street: str | None = None,
+        house: str | None = None,
+        plu: int | None = None,
+        limit: int | None = None,
+    ) -> list[Order]:
+        where: list[str] = []
+        params: list[Any] = []
+        if since is not None:
+            where.append("created >= ?")
+            params.append(since.isoformat())
+        if until is not None:
+            where.append("created < ?")
+            params.append(until.isoformat())
+        if status is not None:
+            statuses = [status] if isinstance(status, OrderStatus) else status
+            where.append(f"status IN ({', '.join('?' * len(statuses))})")
+            params.extend(s.value for s in statuses)
+        for column, value in (("city", city), ("street", street), ("house", house)):
+            if value is not None:
+                where.append(f"{column} = ?")
+                params.append(value)
+        if plu is not None:
+            where.append("id IN (SELECT order_id FROM order_items WHERE plu = ?)")
+            params.append(plu)
+        sql = "FROM orders"
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        sql += " ORDER BY created DESC"
+        if limit is not None:
+            sql += " LIMIT ?"
+            params.append(limit)
+        rows = self.db.execute(f"SELECT {ORDER_COLUMNS} {sql}", params).fetchall()
+        items: dict[str, list[Item]] = {r[0]: [] for r in rows}
+        for r in self.db.execute(
+            "SELECT order_id, plu, name, uom, step, price_regular, price_discount,"
+            f" quantity FROM order_items WHERE order_id IN (SELECT id {sql})"
+            " ORDER BY order_id, pos",
+            params,
+        ):
+            items[r[0]].append(Item(*r[1:]))
+        return [self._from_row(r, items[r[0]]) for r in rows]
+
+    def _from_row(self, r: tuple, basket: list[Item]) -> Order:
+        return Order(
+            id=r[0],
+            human_id=r[1],
+            status=OrderStatus(r[2]),
+            total_sum=r[3],
+            service_sum=r[4],
+            order_sum=r[5],
+            is_active=bool(r[6]),
+            address=Address(r[7], r[8], r[9]) if r[8] is not None else None,
+            created=datetime.fromisoformat(r[10]) if r[10] else None,
+            sap_code=r[11],
+            shop_address=r[12],
+            basket=basket,
+        )
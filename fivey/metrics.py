@@ -0,0 +1,240 @@
+import re
+import threading
+import time
+from bisect import bisect_left
+from dataclasses import dataclass, field
+from functools import wraps
+from typing import Any, Callable, Iterable, Iterator, TypeVar
+
+F = TypeVar("F", bound=Callable[..., Any])
+T = TypeVar("T")
+R = TypeVar("R")
+
+LATENCY_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS = (1_000, 10_000, 100_000, 1_000_000, 10_000_000)
+
+_version_re = re.compile(r"^v\d+$")
+_digit_re = re.compile(r"\d")
+# Сегменты после "stores", которые не являются кодом магазина
+_store_literals = {"map"}
+
+
+def endpoint_template(url: str) -> str:
+    path = url.split("?", 1)[0]
+    segments = path.split("/")
+    out = []
+    for i, seg in enumerate(segments):
+        if i > 0 and segments[i - 1] == "stores" and seg and seg not in _store_literals:
+            out.append("{sap}")
+        elif _digit_re.search(seg) and not _version_re.match(seg):
+            out.append("{id}")
+        else:
+            out.append(seg)
+    return "/".join(out)
+
+
+class Instrument:
+    def on_request_start(self, method: str, endpoint: str) -> None:
+        pass
+
+    def on_request_end(
+        self,
+        method: str,
+        endpoint: str,
+        status: int | None,
+        elapsed: float,
+        size: int,
+    ) -> None:
+        pass
+
+    def on_parse(self, name: str, elapsed: float) -> None:
+        pass
+
+
+@dataclass
+class Histogram:
+    buckets: tuple[float, ...]
+    counts: list[int] = field(default_factory=list)
+    total: float = 0.0
+    count: int = 0
+
+    def __post_init__(self) -> None:
+        if not self.counts:
+            self.counts = [0] * (len(self.buckets) + 1)
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.total += value
+        self.count += 1
+
+    @property
+    def mean(self) -> float:
+        return self.total / self.count if self.count else 0.0
+
+    def quantile(self, q: float) -> float:
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for i, c in enumerate(self.counts):
+            seen += c
+            if seen >= rank:
+                return self.buckets[i] if i < len(self.buckets) else float("inf")
+        return float("inf")
+
+
+@dataclass
+class RequestStats:
+    latency: Histogram = field(default_factory=lambda: Histogram(LATENCY_BUCKETS))
+    size: Histogram = field(default_factory=lambda: Histogram(SIZE_BUCKETS))
+    errors: int = 0
+    in_flight: int = 0
+
+
+class Metrics(Instrument):
+    def __init__(self) -> None:
+        self.requests: dict[tuple[str, str], RequestStats] = {}
+        self.parsers: dict[str, Histogram] = {}
+        self._lock = threading.Lock()
+
+    def on_request_start(self, method: str, endpoint: str) -> None:
+        with self._lock:
+            stats = self.requests.setdefault((method, endpoint), RequestStats())
+            stats.in_flight += 1
+
+    def on_request_end(
+        self,
+        method: str,
+        endpoint: str,
+        status: int | None,
+        elapsed: float,
+        size: int,
+    ) -> None:
+        with self._lock:
+            stats = self.requests.setdefault((method, endpoint), RequestStats())
+            stats.in_flight -= 1
+            stats.latency.observe(elapsed)
+            stats.size.observe(size)
+            if status is None or status >= 400:
+                stats.errors += 1
+
+    def on_parse(self, name: str, elapsed: float) -> None:
+        with self._lock:
+            self.parsers.setdefault(name, Histogram(LATENCY_BUCKETS)).observe(elapsed)
+
+    def summary(self) -> dict[str, Any]:
+        with self._lock:
+            return {
+                "requests": {
+                    f"{method} {endpoint}": {
+                        "count": s.latency.count,
+                        "errors": s.errors,
+                        "error_rate": s.errors / s.latency.count
+                        if s.latency.count
+                        else 0.0,
+                        "latency_mean": s.latency.mean,
+                        "latency_p50": s.latency.quantile(0.5),
+                        "latency_p95": s.latency.quantile(0.95),
+                        "bytes_mean": s.size.mean,
+                    }
+                    for (method, endpoint), s in self.requests.items()
+                },
+                "parsers": {
+                    name: {
+                        "count": h.count,
+                        "mean": h.mean,
+                        "p95": h.quantile(0.95),
+                    }
+                    for name, h in self.parsers.items()
+                },
+            }
+
+
+class PrometheusExporter(Instrument):
+    def __init__(self, registry: Any = None) -> None:
+        # Необязательная зависимость, нужна только для экспорта
+        from prometheus_client import REGISTRY, Counter, Histogram as PromHistogram
+
+        registry = registry or REGISTRY
+        self.latency = PromHistogram(
+            "fivey_request_seconds",
+            "5ka API request latency",
+            ["method", "endpoint"],
+            buckets=LATENCY_BUCKETS,
+            registry=registry,
+        )
+        self.size = PromHistogram(
+            "fivey_response_bytes",
+            "5ka API response size",
+            ["method", "endpoint"],
+            buckets=SIZE_BUCKETS,
+            registry=registry,
+        )
+        self.errors = Counter(
+            "fivey_request_errors",
+            "5ka API failed requests",
+            ["method", "endpoint"],
+            registry=registry,
+        )
+        self.parse = PromHistogram(
+            "fivey_parse_seconds",
+            "5ka API response parse time",
+            ["parser"],
+            buckets=LATENCY_BUCKETS,
+            registry=registry,
+        )
+
+    def on_request_end(
+        self,
+        method: str,
+        endpoint: str,
+        status: int | None,
+        elapsed: float,
+        size: int,
+    ) -> None:
+        self.latency.labels(method, endpoint).observe(elapsed)
+        self.size.labels(method, endpoint).observe(size)
+        if status is None or status >= 400:
+            self.errors.labels(method, endpoint).inc()
+
+    def on_parse(self, name: str, elapsed: float) -> None:
+        self.parse.labels(name).observe(elapsed)
+
+
+def timed(func: F) -> F:
+    @wraps(func)
+    def wrapper(self, *args, **kwargs):
+        instruments = self.cli.instruments
+        if not instruments:
+            return func(self, *args, **kwargs)
+        start = time.perf_counter()
+        try:
+            return func(self, *args, **kwargs)
+        finally:
+            elapsed = time.perf_counter() - start
+            for ins in instruments:
+                ins.on_parse(func.__qualname__, elapsed)
+
+    return wrapper  # type: ignore[return-value]
+
+
+def timed_map(
+    instruments: list[Instrument],
+    name: str,
+    func: Callable[[T], R],
+    items: Iterable[T],
+) -> Iterator[R]:
+    # Для потоковых ответов время разбора суммируется и сообщается один раз
+    if not instruments:
+        yield from map(func, items)
+        return
+    elapsed = 0.0
+    try:
+        for item in items:
+            start = time.perf_counter()
+            result = func(item)
+            elapsed += time.perf_counter() - start
+            yield result
+    finally:
+        for ins in instruments:
+            ins.on_parse(name, elapsed)
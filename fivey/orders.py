@@ -1,9 +1,11 @@
 from dataclasses import dataclass
 from datetime import datetime
 from enum import Enum
-from typing import TYPE_CHECKING, Any
+import threading
+from typing import TYPE_CHECKING, Any, Callable, Iterable, Iterator
 
 from fivey.catalog import Item
+from fivey.metrics import timed
 
 if TYPE_CHECKING:
     from fivey.client import Client
@@ -57,7 +59,11 @@ class OrdersAPI:
     def __init__(self, cli) -> None:
         self.cli: Client = cli
         self.base_path = "/orders"
+        # токен -> привязанные карты
+        self.payment_methods: dict[str | None, list[Card]] = {}
+        self._payment_lock = threading.Lock()
 
+    @timed
     def from_order_response(self, response: dict[str, Any]) -> Order:
         o = Order(
             id=response["id"],
@@ -142,8 +148,34 @@ class OrdersAPI:
             orders.append(self.from_order_response(o))
         return orders
 
+    def iter_orders(self, page_size: int = 20, active: bool = False) -> Iterator[Order]:
+        offset = 0
+        while True:
+            count = 0
+            # Заказы разбираются по мере чтения ответа, а не после загрузки страницы
+            for o in self.cli.stream(
+                f"{self.base_path}/v3/orders/",
+                "items",
+                params={
+                    "offset": offset,
+                    "limit": page_size,
+                    "in_action": active,
+                },
+            ):
+                count += 1
+                yield self.from_order_response(o)
+            if count < page_size:
+                return
+            offset += count
+
     def fetch_additional_data(self, order: Order) -> Order:
-        resp = self.cli.get(f"{self.base_path}/v3/orders/{order.id}/")
+        return self.order_by_id(order.id)
+
+    def fetch_additional_data_many(self, orders: Iterable[Order]) -> list[Order]:
+        return list(self.cli.map(self.fetch_additional_data, orders))
+
+    def order_by_id(self, order_id: str) -> Order:
+        resp = self.cli.get(f"{self.base_path}/v3/orders/{order_id}/")
         assert isinstance(resp, dict)
         return self.from_order_response(resp)
 
@@ -193,7 +225,11 @@ class OrdersAPI:
         assert isinstance(resp, dict)
         return self.from_order_response(resp)
 
-    def get_payment_methods(self) -> list[Card]:
+    def get_payment_methods(self, refresh: bool = False) -> list[Card]:
+        token = self.cli.token
+        with self._payment_lock:
+            if not refresh and token in self.payment_methods:
+                return self.payment_methods[token]
         resp = self.cli.get(f"{self.base_path}/v1/payment-methods")
         assert isinstance(resp, dict)
         cards = [
@@ -201,8 +237,14 @@ class OrdersAPI:
             for c in resp["payments"]
             if c["type"] == "card"
         ]
+        with self._payment_lock:
+            self.payment_methods[token] = cards
         return cards
 
+    def invalidate_payment_methods(self) -> None:
+        with self._payment_lock:
+            self.payment_methods.pop(self.cli.token, None)
+
     def pay(self, payment_method: Card) -> None:
         if self.cli.order is None:
             return None
@@ -217,6 +259,8 @@ class OrdersAPI:
             assert isinstance(resp, dict)
             print(f"Оплатите заказ по ссылке: {resp["form_url"]}")
             input("После оплаты нажмите Enter")
+            # Новая карта могла привязаться к аккаунту при оплате
+            self.invalidate_payment_methods()
         else:
             self.cli.post(
                 f"{self.base_path}/v1/orders/{self.cli.order.id}/pay-by-linked-card",
@@ -231,6 +275,56 @@ class OrdersAPI:
             return None
         self.cli.post(f"{self.base_path}/v1/orders/{self.cli.order.id}/revise")
 
+    def _draft(self, address: tuple[str, str, str, str, str]) -> Order | None:
+        # Черновик создается в своей области, чтобы оплата видела текущий заказ
+        with self.cli.scope(order=self.cli.order):
+            return self.create_order(*address)
+
+    def checkout(
+        self,
+        choose_card: Callable[[list[Card]], Card | None],
+        next_address: tuple[str, str, str, str, str] | None = None,
+        entrance: str = "",
+        flat: str = "",
+        floor: str = "",
+        comment: str = "",
+    ) -> Order | None:
+        if self.cli.order is None:
+            return None
+
+        def prepare() -> None:
+            self.set_address_details(entrance, flat, floor, comment)
+            self.revise()
+
+        revised = self.cli.submit(prepare)
+        methods = self.cli.submit(self.get_payment_methods)
+        # Карту выбирают, пока заказ пересчитывается
+        card = choose_card(methods.result())
+        revised.result()
+        # Отказ от выбора карты - оплаты и нового черновика не будет
+        if card is None:
+            return None
+        draft = (
+            self.cli.submit(self._draft, next_address)
+            if next_address is not None
+            else None
+        )
+        try:
+            self.pay(card)
+        except BaseException:
+            if draft is not None:
+                try:
+                    if (order := draft.result()) is not None:
+                        self.cancel(order, "Оплата не прошла")
+                except Exception:
+                    pass
+            raise
+        if draft is None:
+            return None
+        if (order := draft.result()) is not None:
+            self.cli.order = order
+        return order
+
     def cancel(self, order: Order, reason: str = "Передумал") -> None:
         self.cli.post(
             f"{self.base_path}/v2/orders/{order.id}/cancel/",
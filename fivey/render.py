@@ -0,0 +1,53 @@
+import os
+import shutil
+import signal
+import sys
+from typing import Any, TextIO
+
+
+class Screen:
+    def __init__(self, out: TextIO = sys.stdout) -> None:
+        self.out = out
+        self._size: os.terminal_size | None = None
+        self._rows: list[str] = []
+        self.interactive = out.isatty()
+        if hasattr(signal, "SIGWINCH"):
+            try:
+                signal.signal(signal.SIGWINCH, self.invalidate)
+            except ValueError:
+                # Обработчик можно поставить только из главного потока
+                pass
+
+    @property
+    def size(self) -> os.terminal_size:
+        if self._size is None:
+            self._size = shutil.get_terminal_size()
+        return self._size
+
+    @property
+    def cols(self) -> int:
+        return self.size.columns
+
+    def invalidate(self, *args: Any) -> None:
+        self._size = None
+        self._rows = []
+
+    def draw(self, rows: list[str]) -> None:
+        if not self.interactive:
+            self.out.write("".join(f"{r}\n" for r in rows))
+            self.out.flush()
+            return
+        # Кадр выше терминала прокручивается, позиции строк не сохраняются
+        if len(rows) + 2 > self.size.lines:
+            self._rows = []
+        out = []
+        if not self._rows:
+            out.append("\x1b[H\x1b[2J")
+        for n, row in enumerate(rows):
+            if n >= len(self._rows) or self._rows[n] != row:
+                out.append(f"\x1b[{n + 1};1H{row}\x1b[K")
+        # Стираем хвост прошлого кадра и ввод пользователя под ним
+        out.append(f"\x1b[{len(rows) + 1};1H\x1b[J")
+        self.out.write("".join(out))
+        self.out.flush()
+        self._rows = rows
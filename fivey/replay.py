@@ -0,0 +1,367 @@
+import json
+import os
+import random
+import re
+import threading
+import time
+import uuid
+from dataclasses import asdict, dataclass, field
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from itertools import count
+from typing import Any, Callable
+from urllib.parse import parse_qsl, urlsplit
+
+from requests import Response
+
+from fivey.metrics import endpoint_template
+
+# Обработчик синтетического маршрута: (path, query, тело) -> (http-код, тело)
+RouteHandler = Callable[[str, dict[str, str], Any], tuple[int, Any]]
+
+
+@dataclass
+class Fixture:
+    method: str
+    path: str
+    params: dict[str, Any] = field(default_factory=dict)
+    status: int = 200
+    body: Any = None
+    request: Any = None
+
+    @property
+    def query(self) -> tuple[tuple[str, str], ...]:
+        return _query_key(self.params)
+
+
+def _query_key(params: dict[str, Any] | None) -> tuple[tuple[str, str], ...]:
+    if not params:
+        return ()
+    return tuple(sorted((k, str(v)) for k, v in params.items() if v is not None))
+
+
+class Recorder:
+    def __init__(self, directory: str) -> None:
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self._counter = count(len(os.listdir(directory)))
+        self._lock = threading.Lock()
+
+    def record(
+        self,
+        method: str,
+        url: str,
+        params: dict[str, Any] | None,
+        body: Any,
+        resp: Response,
+    ) -> None:
+        try:
+            data = resp.json()
+        except ValueError:
+            data = resp.text
+        fixture = Fixture(method, url, params or {}, resp.status_code, data, body)
+        with self._lock:
+            n = next(self._counter)
+        slug = re.sub(r"[^A-Za-z0-9]+", "_", url).strip("_")
+        path = os.path.join(self.directory, f"{n:05d}_{method}_{slug}.json")
+        with open(path, "w", encoding="utf-8") as outf:
+            outf.write(json.dumps(asdict(fixture), ensure_ascii=False))
+
+
+def load_fixtures(directory: str) -> list[Fixture]:
+    fixtures = []
+    for name in sorted(os.listdir(directory)):
+        if not name.endswith(".json"):
+            continue
+        with open(os.path.join(directory, name), "r", encoding="utf-8") as inf:
+            fixtures.append(Fixture(**json.loads(inf.read())))
+    return fixtures
+
+
+class MockServer:
+    def __init__(
+        self,
+        fixtures: list[Fixture] | None = None,
+        latency: float = 0.0,
+        jitter: float = 0.0,
+        error_rate: float = 0.0,
+        error_status: int = 503,
+        seed: int | None = None,
+        host: str = "127.0.0.1",
+        port: int = 0,
+    ) -> None:
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.random = random.Random(seed)
+        self.fixtures: dict[tuple[str, str], list[Fixture]] = {}
+        self.templates: dict[tuple[str, str], list[Fixture]] = {}
+        self.routes: dict[tuple[str, str], RouteHandler] = {}
+        self._cursor: dict[int, int] = {}
+        self._lock = threading.Lock()
+        for f in fixtures or []:
+            self.add_fixture(f)
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def _serve(self) -> None:
+                length = int(self.headers.get("Content-Length") or 0)
+                raw = self.rfile.read(length) if length else b""
+                status, body = server.handle(
+                    self.command, self.path, json.loads(raw) if raw else None
+                )
+                payload = json.dumps(body, ensure_ascii=False).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            do_GET = do_POST = do_PUT = do_PATCH = do_DELETE = _serve
+
+            def log_message(self, format: str, *args: Any) -> None:
+                pass
+
+        class Server(ThreadingHTTPServer):
+            # С очередью по умолчанию (5) параллельные подключения теряются
+            # и повторяются только через секунду
+            request_queue_size = 128
+            daemon_threads = True
+
+        self.httpd = Server((host, port), Handler)
+        self._thread: threading.Thread | None = None
+
+    @property
+    def url(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}/api"
+
+    def start(self) -> "MockServer":
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self.httpd.shutdown()
+        self.httpd.server_close()
+        if self._thread:
+            self._thread.join()
+
+    def __enter__(self) -> "MockServer":
+        return self.start()
+
+    def __exit__(self, *exc: object) -> None:
+        self.stop()
+
+    def add_fixture(self, fixture: Fixture) -> None:
+        self.fixtures.setdefault((fixture.method, fixture.path), []).append(fixture)
+        key = (fixture.method, endpoint_template(fixture.path))
+        self.templates.setdefault(key, []).append(fixture)
+
+    def add_route(self, method: str, template: str, handler: RouteHandler) -> None:
+        self.routes[(method, template)] = handler
+
+    def handle(self, method: str, raw_path: str, body: Any = None) -> tuple[int, Any]:
+        delay = self.latency + self.random.uniform(0, self.jitter)
+        if delay:
+            time.sleep(delay)
+        if self.error_rate and self.random.random() < self.error_rate:
+            return self.error_status, {"detail": "Injected error"}
+        parts = urlsplit(raw_path)
+        path = parts.path.removeprefix("/api")
+        query = dict(parse_qsl(parts.query))
+        if handler := self.routes.get((method, endpoint_template(path))):
+            return handler(path, query, body)
+        candidates = self.fixtures.get((method, path)) or self.templates.get(
+            (method, endpoint_template(path)), []
+        )
+        exact = [f for f in candidates if f.query == tuple(sorted(query.items()))]
+        if exact:
+            candidates = exact
+        if not candidates:
+            return 404, {"detail": f"No fixture for {method} {path}"}
+        # Повторные запросы получают записанные ответы по очереди
+        with self._lock:
+            n = self._cursor.get(id(candidates[0]), 0)
+            self._cursor[id(candidates[0])] = n + 1
+        f = candidates[n % len(candidates)]
+        return f.status, f.body
+
+    def add_synthetic_catalog(
+        self,
+        categories: int = 20,
+        subcategories: int = 10,
+        products: int = 100,
+    ) -> None:
+        tree = []
+        listing: dict[str, list[dict[str, Any]]] = {}
+        plu = count(1_000_000)
+        for c in range(categories):
+            subs = []
+            for s in range(subcategories):
+                sub_id = f"{c}C{s}"
+                subs.append({"id": sub_id, "name": f"Подкатегория {c}.{s}"})
+                listing[sub_id] = [
+                    synthetic_product(next(plu), self.random) for _ in range(products)
+                ]
+            tree.append({"id": f"{c}", "name": f"Категория {c}", "categories": subs})
+        everything = [p for ps in listing.values() for p in ps]
+
+        def products_list(
+            path: str, query: dict[str, str], body: Any
+        ) -> tuple[int, Any]:
+            sub_id = path.rstrip("/").split("/")[-2]
+            if sub_id not in listing:
+                return 404, {"detail": "Category not found"}
+            return 200, {"products": listing[sub_id]}
+
+        def search(path: str, query: dict[str, str], body: Any) -> tuple[int, Any]:
+            q = query.get("q", "").lower()
+            found = [p for p in everything if q in p["name"].lower()]
+            offset = int(query.get("offset", 0))
+            return 200, {"products": found[offset : offset + 100]}
+
+        self.add_route(
+            "GET",
+            "/catalog/v2/stores/{sap}/categories",
+            lambda path, query, body: (200, tree),
+        )
+        self.add_route(
+            "GET",
+            "/catalog/v2/stores/{sap}/categories/{id}/products_list",
+            products_list,
+        )
+        self.add_route("GET", "/catalog/v3/stores/{sap}/search", search)
+
+    def add_synthetic_orders(
+        self, orders: int = 100, basket_size: int = 20, sap_code: str = "35XY"
+    ) -> None:
+        created = datetime(2024, 1, 1)
+        items = [
+            synthetic_order(
+                created + timedelta(hours=i), basket_size, sap_code, self.random
+            )
+            for i in range(orders)
+        ]
+        items.reverse()
+        by_id = {o["id"]: o for o in items}
+
+        def orders_list(path: str, query: dict[str, str], body: Any) -> tuple[int, Any]:
+            offset = int(query.get("offset", 0))
+            limit = int(query.get("limit", 20))
+            selected = items
+            if query.get("in_action") == "True":
+                selected = [o for o in items if o["is_active"]]
+            return 200, {"items": selected[offset : offset + limit]}
+
+        def order_detail(
+            path: str, query: dict[str, str], body: Any
+        ) -> tuple[int, Any]:
+            order_id = path.rstrip("/").split("/")[-1]
+            if order_id not in by_id:
+                return 404, {"detail": "Order not found"}
+            return 200, by_id[order_id]
+
+        self.add_route("GET", "/orders/v3/orders/", orders_list)
+        self.add_route("GET", "/orders/v3/orders/{id}/", order_detail)
+
+    def add_synthetic_basket(self, order: dict[str, Any]) -> None:
+        items: dict[int, dict[str, Any]] = {
+            int(i["product_plu"]): i for i in order["basket"]["items"]
+        }
+        lock = threading.Lock()
+
+        def respond() -> tuple[int, Any]:
+            total = sum(
+                float(i["price_promo"] or i["price_reg"]) * float(i["quantity"])
+                for i in items.values()
+            )
+            basket = {
+                "items": list(items.values()),
+                "total_sum": f"{round(total, 2)}",
+                "final_sum": f"{round(total + 99, 2)}",
+            }
+            return 200, {**order, "basket": basket}
+
+        def change(plu: int, qty: float) -> tuple[int, Any]:
+            with lock:
+                if qty <= 0:
+                    items.pop(plu, None)
+                else:
+                    p = synthetic_product(plu, self.random)
+                    items.setdefault(
+                        plu,
+                        {
+                            "product_plu": plu,
+                            "name": p["name"],
+                            "uom": p["uom"],
+                            "step": p["step"],
+                            "price_reg": p["prices"]["regular"],
+                            "price_promo": p["prices"]["discount"],
+                        },
+                    )["quantity"] = f"{qty}"
+                return respond()
+
+        def post(path: str, query: dict[str, str], body: Any) -> tuple[int, Any]:
+            return change(int(body["plu"]), float(body["qty"]))
+
+        def put(path: str, query: dict[str, str], body: Any) -> tuple[int, Any]:
+            return change(int(path.rstrip("/").split("/")[-1]), float(body["qty"]))
+
+        def delete(path: str, query: dict[str, str], body: Any) -> tuple[int, Any]:
+            return change(int(path.rstrip("/").split("/")[-1]), 0)
+
+        self.add_route("POST", "/orders/v3/orders/{id}/item/", post)
+        self.add_route("PUT", "/orders/v3/orders/{id}/item/{id}/", put)
+        self.add_route("DELETE", "/orders/v3/orders/{id}/item/{id}/", delete)
+
+
+def synthetic_product(plu: int, rnd: random.Random) -> dict[str, Any]:
+    regular = round(rnd.uniform(30, 1500), 2)
+    return {
+        "plu": plu,
+        "name": f"Товар {plu}",
+        "uom": rnd.choice(["шт", "кг"]),
+        "step": "1",
+        "prices": {
+            "regular": f"{regular}",
+            "discount": f"{round(regular * 0.8, 2)}" if rnd.random() < 0.3 else None,
+        },
+    }
+
+
+def synthetic_order(
+    created: datetime, basket_size: int, sap_code: str, rnd: random.Random
+) -> dict[str, Any]:
+    basket = []
+    for _ in range(basket_size):
+        p = synthetic_product(rnd.randint(1_000_000, 9_999_999), rnd)
+        basket.append(
+            {
+                "product_plu": p["plu"],
+                "name": p["name"],
+                "uom": p["uom"],
+                "step": p["step"],
+                "price_reg": p["prices"]["regular"],
+                "price_promo": p["prices"]["discount"],
+                "quantity": f"{rnd.randint(1, 5)}",
+            }
+        )
+    total = round(sum(float(i["price_reg"]) * float(i["quantity"]) for i in basket), 2)
+    return {
+        "id": str(uuid.UUID(int=rnd.getrandbits(128))),
+        "human_id": rnd.randint(10_000_000, 99_999_999),
+        "status": 9,
+        "total_sum": total + 99,
+        "is_active": False,
+        "address": {"house": "1", "street": "Тестовая улица", "city": "Москва"},
+        "created": created.isoformat(),
+        "sap_code": sap_code,
+        "shop_address": "Тестовая улица, 1",
+        "basket": {
+            "items": basket,
+            "total_sum": f"{total}",
+            "final_sum": f"{total + 99}",
+        },
+    }
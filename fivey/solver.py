@@ -0,0 +1,100 @@
+from dataclasses import dataclass, field
+import threading
+from typing import TYPE_CHECKING
+
+from fivey.catalog import Item
+from fivey.stores import Store
+
+if TYPE_CHECKING:
+    from fivey.client import Client
+
+
+@dataclass
+class ListEntry:
+    # PLU или текст для поиска
+    query: int | str
+    quantity: float = 1
+
+
+@dataclass
+class StoreQuote:
+    store: Store
+    total: float
+    items: list[Item | None]
+    missing: list[ListEntry] = field(default_factory=list)
+
+
+class BasketSolver:
+    def __init__(self, cli) -> None:
+        self.cli: Client = cli
+        self.cache: dict[tuple[str, str], list[Item]] = {}
+        self._lock = threading.Lock()
+
+    def candidates(self, sap_code: str, entry: ListEntry) -> list[Item]:
+        key = (sap_code, str(entry.query))
+        with self._lock:
+            if key in self.cache:
+                return self.cache[key]
+        items = self.cli.catalog.search(str(entry.query), sap_code=sap_code)
+        with self._lock:
+            self.cache[key] = items
+        return items
+
+    def resolve(self, entry: ListEntry, found: list[list[Item]]) -> int | None:
+        if isinstance(entry.query, int):
+            return entry.query
+        # Для текстового запроса берем PLU, который нашелся в большинстве магазинов,
+        # при равенстве - тот, что выше в выдаче
+        score: dict[int, tuple[int, int]] = {}
+        for items in found:
+            for rank, item in enumerate(items):
+                stores, best = score.get(item.plu, (0, rank))
+                score[item.plu] = (stores + 1, min(best, rank))
+        if not score:
+            return None
+        return max(score, key=lambda plu: (score[plu][0], -score[plu][1]))
+
+    def solve(self, stores: list[Store], entries: list[ListEntry]) -> list[StoreQuote]:
+        pairs = [(s, e) for s in stores for e in entries]
+        results = list(
+            self.cli.map(lambda p: self.candidates(p[0].sap_code, p[1]), pairs)
+        )
+        # found[e][s] - результаты поиска позиции e в магазине s
+        found = [
+            [results[s * len(entries) + e] for s in range(len(stores))]
+            for e in range(len(entries))
+        ]
+        plus = [self.resolve(entry, found[e]) for e, entry in enumerate(entries)]
+        matrix = [
+            [
+                next((i for i in found[e][s] if i.plu == plus[e]), None)
+                for e in range(len(entries))
+            ]
+            for s in range(len(stores))
+        ]
+        quotes = []
+        for s, store in enumerate(stores):
+            row = matrix[s]
+            quotes.append(
+                StoreQuote(
+                    store=store,
+                    total=round(
+                        sum(
+                            item.price * entries[e].quantity
+                            for e, item in enumerate(row)
+                            if item is not None
+                        ),
+                        2,
+                    ),
+                    items=row,
+                    missing=[entries[e] for e, item in enumerate(row) if item is None],
+                )
+            )
+        quotes.sort(key=lambda q: (len(q.missing), q.total))
+        return quotes
+
+    def solve_nearby(
+        self, lat: float, lon: float, entries: list[ListEntry], radius: float = 0.025
+    ) -> list[StoreQuote]:
+        stores = self.cli.stores.nearby_stores_by_location(lat, lon, radius)
+        return self.solve(stores, entries)
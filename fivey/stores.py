@@ -1,11 +1,16 @@
+from concurrent.futures import FIRST_COMPLETED, Future, wait
 from dataclasses import dataclass
-from typing import TYPE_CHECKING
+from typing import TYPE_CHECKING, Iterable, Iterator
 
 
 if TYPE_CHECKING:
     from fivey.client import Client
 
 
+# top_latitude, bottom_latitude, left_longitude, right_longitude
+Area = tuple[float, float, float, float]
+
+
 @dataclass
 class Store:
     shop_address: str
@@ -18,6 +23,7 @@ class Store:
 class StoresAPI:
     def __init__(self, cli) -> None:
         self.cli: Client = cli
+        self.location_cache: dict[tuple[float, float], Store] = {}
 
     def store_by_location(self, lat: float, lon: float) -> Store:
         resp = self.cli.get(
@@ -30,16 +36,51 @@ class StoresAPI:
         assert isinstance(resp, dict)
         return Store(**resp)
 
+    def store_by_locations(
+        self,
+        points: list[tuple[float, float]],
+        precision: int = 4,
+    ) -> list[Store | Exception]:
+        # Близкие точки (до precision знаков) обслуживает один магазин
+        keys = [(round(lat, precision), round(lon, precision)) for lat, lon in points]
+        found: dict[tuple[float, float], Store | Exception] = {
+            k: self.location_cache[k] for k in keys if k in self.location_cache
+        }
+        missing = list(dict.fromkeys(k for k in keys if k not in found))
+        futures = {self.cli.submit(self.store_by_location, *k): k for k in missing}
+        for fut, k in futures.items():
+            try:
+                store = fut.result()
+            except Exception as e:
+                found[k] = e
+            else:
+                self.location_cache[k] = store
+                found[k] = store
+        return [found[k] for k in keys]
+
+    def store_by_location_many(
+        self, points: Iterable[tuple[float, float]]
+    ) -> list[Future[Store]]:
+        return [
+            self.cli.submit(self.store_by_location, lat, lon) for lat, lon in points
+        ]
+
     def nearby_stores_by_location(
         self, lat: float, lon: float, radius: float = 0.025
     ) -> list[Store]:
+        return self.stores_in_area(
+            (lat + radius, lat - radius, lon - radius, lon + radius)
+        )
+
+    def stores_in_area(self, area: Area) -> list[Store]:
+        top, bottom, left, right = area
         resp = self.cli.get(
             "/cita/v1/stores/map",
             params={
-                "top_latitude": lat + radius,
-                "bottom_latitude": lat - radius,
-                "left_longitude": lon - radius,
-                "right_longitude": lon + radius,
+                "top_latitude": top,
+                "bottom_latitude": bottom,
+                "left_longitude": left,
+                "right_longitude": right,
             },
         )
         assert isinstance(resp, dict)
@@ -48,9 +89,66 @@ class StoresAPI:
             res.append(Store(st["address"], "", st["sap_code"], True, st["is_24h"]))
         return res
 
+    def harvest_stores(
+        self,
+        area: Area,
+        tile_size: float = 0.05,
+        saturation: int = 100,
+        min_tile_size: float = 0.002,
+    ) -> Iterator[Store]:
+        seen: set[str] = set()
+        pending: dict[Future[list[Store]], Area] = {
+            self.cli.submit(self.stores_in_area, tile): tile
+            for tile in _split_area(area, tile_size)
+        }
+        try:
+            while pending:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for fut in done:
+                    tile = pending.pop(fut)
+                    stores = fut.result()
+                    # Ответ мог быть обрезан - дробим плитку и запрашиваем заново
+                    if len(stores) >= saturation and tile[0] - tile[1] > min_tile_size:
+                        for sub in _quarter_area(tile):
+                            pending[self.cli.submit(self.stores_in_area, sub)] = sub
+                    for st in stores:
+                        if st.sap_code not in seen:
+                            seen.add(st.sap_code)
+                            yield st
+        finally:
+            for fut in pending:
+                fut.cancel()
+
     def set_current_store(self, store: Store) -> Store:
         self.cli.store = store
         return store
 
     def get_current_store(self) -> Store | None:
         return self.cli.store
+
+
+def _split_area(area: Area, tile_size: float) -> list[Area]:
+    top, bottom, left, right = area
+    tiles = []
+    lat = bottom
+    while lat < top:
+        lon = left
+        while lon < right:
+            tiles.append(
+                (min(lat + tile_size, top), lat, lon, min(lon + tile_size, right))
+            )
+            lon += tile_size
+        lat += tile_size
+    return tiles
+
+
+def _quarter_area(area: Area) -> list[Area]:
+    top, bottom, left, right = area
+    mid_lat = (top + bottom) / 2
+    mid_lon = (left + right) / 2
+    return [
+        (top, mid_lat, left, mid_lon),
+        (top, mid_lat, mid_lon, right),
+        (mid_lat, bottom, left, mid_lon),
+        (mid_lat, bottom, mid_lon, right),
+    ]
@@ -0,0 +1,151 @@
+import atexit
+import cProfile
+from contextlib import contextmanager
+from functools import wraps
+import json
+import os
+import threading
+import time
+from typing import Any, Callable, Iterator
+
+from fivey.metrics import F, Instrument
+
+PROFILE_ENV = "FIVEY_PROFILE"
+PROFILE_DIR_ENV = "FIVEY_PROFILE_DIR"
+
+
+class Tracer(Instrument):
+    def __init__(self) -> None:
+        self.events: list[dict[str, Any]] = []
+        self.threads: dict[int, str] = {}
+        self._start = time.perf_counter()
+        self._lock = threading.Lock()
+
+    def add(
+        self,
+        name: str,
+        cat: str,
+        start: float,
+        elapsed: float,
+        args: dict[str, Any] | None = None,
+    ) -> None:
+        thread = threading.current_thread()
+        event = {
+            "name": name,
+            "cat": cat,
+            "ph": "X",
+            "ts": (start - self._start) * 1e6,
+            "dur": elapsed * 1e6,
+            "pid": os.getpid(),
+            "tid": thread.ident,
+        }
+        if args:
+            event["args"] = args
+        with self._lock:
+            self.events.append(event)
+            assert thread.ident is not None
+            self.threads.setdefault(thread.ident, thread.name)
+
+    @contextmanager
+    def span(self, name: str, cat: str = "fivey") -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, cat, start, time.perf_counter() - start)
+
+    def on_request_end(
+        self,
+        method: str,
+        endpoint: str,
+        status: int | None,
+        elapsed: float,
+        size: int,
+    ) -> None:
+        # Хук вызывается по завершении запроса, начало восстанавливаем по длительности
+        self.add(
+            f"{method} {endpoint}",
+            "http",
+            time.perf_counter() - elapsed,
+            elapsed,
+            {"status": status, "bytes": size},
+        )
+
+    def on_parse(self, name: str, elapsed: float) -> None:
+        self.add(name, "parse", time.perf_counter() - elapsed, elapsed)
+
+    def chrome_trace(self) -> dict[str, Any]:
+        with self._lock:
+            events = list(self.events)
+            threads = dict(self.threads)
+        meta = [
+            {
+                "name": "thread_name",
+                "ph": "M",
+                "pid": os.getpid(),
+                "tid": tid,
+                "args": {"name": name},
+            }
+            for tid, name in threads.items()
+        ]
+        return {"traceEvents": meta + events, "displayTimeUnit": "ms"}
+
+
+class Profiler:
+    def __init__(self, directory: str = ".") -> None:
+        self.directory = directory
+        self.tracer = Tracer()
+        # cProfile видит только поток, в котором включен
+        self.profile = cProfile.Profile()
+        self.started = time.strftime("%Y%m%d-%H%M%S")
+
+    def start(self) -> None:
+        self.profile.enable()
+
+    def stop(self) -> None:
+        self.profile.disable()
+
+    def dump(self) -> tuple[str, str]:
+        self.stop()
+        os.makedirs(self.directory, exist_ok=True)
+        base = os.path.join(self.directory, f"fivey-{self.started}-{os.getpid()}")
+        # Формат Chrome trace открывается и в chrome://tracing, и в speedscope
+        with open(f"{base}.trace.json", "w") as f:
+            json.dump(self.tracer.chrome_trace(), f)
+        self.profile.dump_stats(f"{base}.prof")
+        return f"{base}.trace.json", f"{base}.prof"
+
+
+_profiler: Profiler | None = None
+_profiler_lock = threading.Lock()
+
+
+def enabled() -> bool:
+    return os.environ.get(PROFILE_ENV, "") not in ("", "0")
+
+
+def active() -> Profiler | None:
+    global _profiler
+    if _profiler is not None or not enabled():
+        return _profiler
+    with _profiler_lock:
+        if _profiler is None:
+            profiler = Profiler(os.environ.get(PROFILE_DIR_ENV, "."))
+            profiler.start()
+            atexit.register(profiler.dump)
+            _profiler = profiler
+    return _profiler
+
+
+def traced(name: str, cat: str = "fivey") -> Callable[[F], F]:
+    def decorator(func: F) -> F:
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            if (profiler := active()) is None:
+                return func(*args, **kwargs)
+            with profiler.tracer.span(name, cat):
+                return func(*args, **kwargs)
+
+        return wrapper  # type: ignore[return-value]
+
+    return decorator
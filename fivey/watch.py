@@ -0,0 +1,216 @@
+import heapq
+import random
+import threading
+import time
+from concurrent.futures import Future
+from dataclasses import dataclass, field
+from itertools import count
+from typing import TYPE_CHECKING, Callable
+
+from fivey.catalog import Item
+
+if TYPE_CHECKING:
+    from fivey.client import Client
+
+
+@dataclass
+class PriceChange:
+    sap_code: str
+    item: Item
+    previous: Item
+
+
+@dataclass
+class PollUnit:
+    sap_code: str
+    # id подкатегории или None, если PLU не нашелся в каталоге и ищется поиском
+    category_id: str | None
+    plus: set[int] = field(default_factory=set)
+    priority: int = 0
+
+
+class PriceWatcher:
+    def __init__(
+        self,
+        cli,
+        on_change: Callable[[PriceChange], None],
+        interval: float = 900,
+        jitter: float = 0.1,
+        retry_delay: float = 5.0,
+    ) -> None:
+        self.cli: Client = cli
+        self.on_change = on_change
+        self.interval = interval
+        self.jitter = jitter
+        self.retry_delay = retry_delay
+        self.watched: dict[tuple[str, int], int] = {}
+        self.last: dict[tuple[str, int], Item] = {}
+        self.units: dict[tuple[str, str | None, int | None], PollUnit] = {}
+        self._unresolved: set[tuple[str, int]] = set()
+        # sap_code -> поиск категорий, идущий в пуле клиента
+        self._resolving: dict[str, tuple[Future[None], set[int]]] = {}
+        # sap_code -> (число неудач подряд, время следующей попытки)
+        self._backoff: dict[str, tuple[int, float]] = {}
+        self._queue: list[tuple[float, int, int, tuple]] = []
+        self._scheduled: set[tuple] = set()
+        self._seq = count()
+        self._lock = threading.Lock()
+        self._random = random.Random()
+
+    def watch(self, sap_code: str, plu: int, priority: int = 0) -> None:
+        with self._lock:
+            self.watched[(sap_code, plu)] = priority
+            self._unresolved.add((sap_code, plu))
+
+    def unwatch(self, sap_code: str, plu: int) -> None:
+        with self._lock:
+            self.watched.pop((sap_code, plu), None)
+            self._unresolved.discard((sap_code, plu))
+            for key, unit in list(self.units.items()):
+                if unit.sap_code == sap_code:
+                    unit.plus.discard(plu)
+                    if not unit.plus:
+                        del self.units[key]
+
+    def _resolve(self, now: float) -> None:
+        # Завершенные поиски: при ошибке PLU возвращаются в очередь с отсрочкой
+        for sap_code, (fut, plus) in list(self._resolving.items()):
+            if not fut.done():
+                continue
+            del self._resolving[sap_code]
+            try:
+                fut.result()
+            except Exception:
+                failures = self._backoff.get(sap_code, (0, 0.0))[0] + 1
+                delay = min(self.retry_delay * 2 ** (failures - 1), self.interval)
+                self._backoff[sap_code] = (failures, now + delay)
+                with self._lock:
+                    self._unresolved.update(
+                        (sap_code, plu)
+                        for plu in plus
+                        if (sap_code, plu) in self.watched
+                    )
+            else:
+                self._backoff.pop(sap_code, None)
+        with self._lock:
+            stores: dict[str, set[int]] = {}
+            for sap_code, plu in self._unresolved:
+                if sap_code in self._resolving:
+                    continue
+                if self._backoff.get(sap_code, (0, 0.0))[1] > now:
+                    continue
+                stores.setdefault(sap_code, set()).add(plu)
+            for sap_code, plus in stores.items():
+                self._unresolved.difference_update((sap_code, plu) for plu in plus)
+        # Обход каталога долгий, поэтому идет в пуле и не задерживает опрос
+        for sap_code, plus in stores.items():
+            self._resolving[sap_code] = (
+                self.cli.submit(self._resolve_store, sap_code, plus),
+                plus,
+            )
+
+    def _resolve_store(self, sap_code: str, plus: set[int]) -> None:
+        # Обходим подкатегории, пока не найдем все отслеживаемые PLU. Списки
+        # берутся свежие: в кеше дерева товар может остаться в старой категории,
+        # а его цена - устаревшей
+        found: dict[int, str] = {}
+        tree = self.cli.catalog.category_tree(sap_code)
+        assert tree is not None
+        for sub in tree.leaves():
+            for item in tree.products(sub.id, refresh=True):
+                if item.plu in plus:
+                    found[item.plu] = sub.id
+                    self._observe(sap_code, item)
+            if len(found) == len(plus):
+                break
+        with self._lock:
+            for plu in plus:
+                if (sap_code, plu) not in self.watched:
+                    continue
+                category_id = found.get(plu)
+                key = (sap_code, category_id, None if category_id else plu)
+                unit = self.units.setdefault(key, PollUnit(sap_code, category_id))
+                unit.plus.add(plu)
+                unit.priority = max(unit.priority, self.watched[(sap_code, plu)])
+                self._schedule(key, unit, time.monotonic())
+
+    def _schedule(self, key: tuple, unit: PollUnit, base: float) -> None:
+        if key in self._scheduled:
+            return
+        self._scheduled.add(key)
+        interval = self.interval / (unit.priority + 1)
+        delay = interval * (1 + self._random.uniform(-self.jitter, self.jitter))
+        heapq.heappush(
+            self._queue, (base + delay, -unit.priority, next(self._seq), key)
+        )
+
+    def _observe(self, sap_code: str, item: Item) -> None:
+        key = (sap_code, item.plu)
+        with self._lock:
+            if key not in self.watched:
+                return
+            previous = self.last.get(key)
+            self.last[key] = item
+        if previous is not None and (
+            previous.price_regular != item.price_regular
+            or previous.price_discount != item.price_discount
+        ):
+            self.on_change(PriceChange(sap_code, item, previous))
+
+    def poll(self, unit: PollUnit) -> None:
+        if unit.category_id is None:
+            for plu in list(unit.plus):
+                for item in self.cli.catalog.search(str(plu), sap_code=unit.sap_code):
+                    if item.plu == plu:
+                        self._observe(unit.sap_code, item)
+            return
+        items = self.cli.catalog.products_list(unit.category_id, unit.sap_code)
+        seen = set()
+        for item in items:
+            if item.plu in unit.plus:
+                seen.add(item.plu)
+                self._observe(unit.sap_code, item)
+        # Товар переехал в другую категорию - найдем его заново
+        if missing := unit.plus - seen:
+            with self._lock:
+                unit.plus -= missing
+                self._unresolved.update((unit.sap_code, plu) for plu in missing)
+
+    def _due(self, now: float) -> list[tuple[tuple, PollUnit]]:
+        due = []
+        with self._lock:
+            while self._queue and self._queue[0][0] <= now:
+                _, _, _, key = heapq.heappop(self._queue)
+                self._scheduled.discard(key)
+                if (unit := self.units.get(key)) is not None and unit.plus:
+                    due.append((key, unit))
+        return due
+
+    def run(self, stop: threading.Event | None = None) -> None:
+        stop = stop or threading.Event()
+        while not stop.is_set():
+            now = time.monotonic()
+            self._resolve(now)
+            due = self._due(now)
+            for (key, unit), fut in zip(
+                due, [self.cli.submit(self.poll, unit) for _, unit in due]
+            ):
+                try:
+                    fut.result()
+                except Exception:
+                    # Ошибка опроса не должна останавливать наблюдение
+                    pass
+                with self._lock:
+                    self._schedule(key, unit, now)
+            with self._lock:
+                wakeups = [self._queue[0][0]] if self._queue else []
+            wakeups.extend(
+                at
+                for sap, (_, at) in self._backoff.items()
+                if sap not in self._resolving
+            )
+            wait = min(wakeups) - time.monotonic() if wakeups else 1
+            if self._resolving:
+                # Результат поиска категорий подбирается без задержки на секунду
+                wait = min(wait, 0.1)
+            stop.wait(max(0.0, min(wait, 1.0)))
@@ -0,0 +1,39 @@
+from pathlib import Path
+from typing import Any
+
+import pytest
+
+from fivey.client import Client
+from fivey.history import OrderHistory
+from fivey.replay import MockServer
+
+
+def test_interrupted_sync_is_resumed(tmp_path: Path) -> None:
+    with MockServer(seed=5) as srv:
+        srv.add_synthetic_orders(orders=50, basket_size=3)
+        detail = srv.routes[("GET", "/orders/v3/orders/{id}/")]
+        calls = 0
+
+        def flaky_detail(path: str, query: dict[str, str], body: Any):
+            nonlocal calls
+            calls += 1
+            # Сеть пропадает на 25-м заказе, после сохранения первой страницы
+            if calls >= 25:
+                return 503, {"detail": "Service unavailable"}
+            return detail(path, query, body)
+
+        srv.add_route("GET", "/orders/v3/orders/{id}/", flaky_detail)
+        db = str(tmp_path / "orders.db")
+        with pytest.raises(ExceptionGroup):
+            OrderHistory(Client(base_url=srv.url, workers=1), db).sync()
+        assert len(OrderHistory(Client(base_url=srv.url), db).query()) == 20
+
+        srv.add_route("GET", "/orders/v3/orders/{id}/", detail)
+        # У первого клиента после ошибок открыт предохранитель, берем новый
+        history = OrderHistory(Client(base_url=srv.url), db)
+        result = history.sync()
+        assert result.added == 30
+        assert len(history.query()) == 50
+
+        again = history.sync()
+        assert (again.added, again.pages) == (0, 1)